@@ -0,0 +1,25 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+
+
+class EmailBackend(ModelBackend):
+    """
+    Вход по email: один SELECT (по индексу auth_user.email, вместе с profile)
+    и ровно один расчёт хэша пароля. Устаревший хэш пересчитывается
+    check_password при успешном входе (см. PASSWORD_HASHERS).
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+
+        # Как раньше в EmailTokenObtainPairSerializer: точное совпадение email
+        user = User.objects.select_related('profile').filter(email=email).order_by('pk').first()
+        if user is None:
+            # Хэшируем впустую, чтобы время ответа не выдавало, есть ли такой email
+            User().set_password(password)
+            return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,49 @@
+from django.contrib.auth.models import User
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+# Версия набора claims: токены без неё (выданные раньше) проверяются по БД, как прежде
+CLAIMS_VERSION_CLAIM = 'pcv'
+CLAIMS_VERSION = 1
+
+
+def add_principal_claims(token, user):
+    """
+    Кладёт в токен активность пользователя: по ней ClaimsJWTAuthentication
+    пускает запрос без SELECT пользователя. Роль и команда в токен не идут —
+    права проверяются через get_principal (кэш с версией на пользователя).
+    """
+    token[CLAIMS_VERSION_CLAIM] = CLAIMS_VERSION
+    token['is_active'] = user.is_active
+    return token
+
+
+class PrincipalRefreshToken(RefreshToken):
+    """
+    RefreshToken с claims пользователя. При обновлении access-токена claims
+    перечитываются, так что блокировка видна в них не позже ACCESS_TOKEN_LIFETIME.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.claims_user = user
+        return add_principal_claims(token, user)
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        user = getattr(self, 'claims_user', None)
+        if user is None:
+            user = User.objects.filter(
+                **{api_settings.USER_ID_FIELD: self.payload.get(api_settings.USER_ID_CLAIM)}
+            ).first()
+        if user is not None:
+            add_principal_claims(access, user)
+        return access
+
+
+class PrincipalTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = PrincipalRefreshToken
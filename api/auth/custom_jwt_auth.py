@@ -1,4 +1,13 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .claims import CLAIMS_VERSION, CLAIMS_VERSION_CLAIM
+from .user_cache import get_cached_user
 
 class CustomJWTAuthentication(JWTAuthentication):
     def get_header(self, request):
@@ -13,3 +22,65 @@ class CustomJWTAuthentication(JWTAuthentication):
         if header.startswith(b'Token '):
             return b'Bearer ' + header[6:]  # удаляем "Token ", вставляем "Bearer "
         return header
+
+
+def load_active_user(user_id):
+    user = get_cached_user(user_id)
+    # Claim is_active — только подсказка: если строка уже загружена, решает она
+    if not user.is_active:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    return user
+
+
+class ClaimsUser(SimpleLazyObject):
+    """
+    request.user по claims access-токена. id и is_active берутся из токена
+    без БД; к остальным полям — первое обращение подставляет User из кэша
+    процесса, см. get_cached_user. Если к этому моменту пользователь
+    деактивирован — 401.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id, claims):
+        super().__init__(lambda: load_active_user(user_id))
+        # Напрямую в __dict__: LazyObject.__setattr__ загрузил бы пользователя
+        self.__dict__['_claims'] = dict(claims, user_id=user_id)
+
+    @property
+    def pk(self):
+        return self._claims['user_id']
+
+    @property
+    def id(self):
+        return self._claims['user_id']
+
+    @property
+    def is_active(self):
+        if self._wrapped is not empty:
+            return self._wrapped.is_active
+        return self._claims['is_active']
+
+
+class ClaimsJWTAuthentication(CustomJWTAuthentication):
+    """
+    Как CustomJWTAuthentication, но без SELECT пользователя на каждый запрос,
+    если токен выдан с claims (PrincipalRefreshToken).
+    """
+
+    def get_user(self, validated_token):
+        if validated_token.get(CLAIMS_VERSION_CLAIM) != CLAIMS_VERSION:
+            return super().get_user(validated_token)  # старый токен — из БД
+
+        try:
+            # simplejwt кладёт id строкой; приводим к типу pk — иначе ключ кэша
+            # пользователя не совпадёт с тем, что сбрасывают сигналы
+            user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+        except ValidationError:
+            raise InvalidToken('Token contained invalid user identification')
+        if not validated_token.get('is_active'):
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+        return ClaimsUser(user_id, {'is_active': validated_token.get('is_active')})
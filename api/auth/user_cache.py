@@ -0,0 +1,70 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.cache import bump_version, get_version
+
+
+USER_CACHE_TTL = 60      # сек.; страховка, если версию где-то не подняли
+USER_CACHE_SIZE = 2048   # пользователей на процесс
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # user_id -> (expires_at, версия, значения User)
+
+
+def user_version_key(user_id):
+    # Версия в общем кэше Django: сохранение пользователя в одном процессе
+    # сбрасывает его копии во всех остальных
+    return f'auth-user:version:{user_id}'
+
+
+def _field_values(instance):
+    return [getattr(instance, field.attname) for field in instance._meta.concrete_fields]
+
+
+def _hydrate(model, values):
+    # Каждому запросу — свой экземпляр: изменения не попадают в кэш
+    return model.from_db('default', None, copy.deepcopy(values))
+
+
+def get_cached_user(user_id):
+    """
+    User из кэша процесса; в БД — только при промахе, после смены версии
+    пользователя или по истечении USER_CACHE_TTL. Profile не кэшируется:
+    user.profile читается из БД при первом обращении, так что пишущие
+    вьюхи сохраняют свежую строку.
+    """
+    # Версию читаем до строки: если её поднимут во время загрузки, запись не подойдёт
+    version = get_version(user_version_key(user_id))
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is not None and entry[0] > now and entry[1] == version:
+            _entries.move_to_end(user_id)
+        else:
+            entry = None
+
+    if entry is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        entry = (now + USER_CACHE_TTL, version, _field_values(user))
+        with _lock:
+            _entries[user_id] = entry
+            _entries.move_to_end(user_id)
+            while len(_entries) > USER_CACHE_SIZE:
+                _entries.popitem(last=False)
+
+    return _hydrate(User, entry[2])
+
+
+def invalidate_cached_user(user_id):
+    with _lock:
+        _entries.pop(user_id, None)
+    # Версию поднимаем после коммита: за время транзакции кэш мог заполниться старой строкой
+    transaction.on_commit(lambda: bump_version(user_version_key(user_id)))
@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import APIException, ValidationError
+
+from .cache import bump_board_version
+from .inbox import invalidate_inbox_counters
+from .models import BookingRequest, CargoAdmin, TruckAdmin
+from .utils import refresh_listing_availability
+
+
+# Из какого статуса в какие можно перевести заявку
+ALLOWED_TRANSITIONS = {
+    'Waiting': {'Accepted', 'Rejected', 'Cancelled'},
+    'Accepted': {'Finished', 'Cancelled'},
+}
+
+# Поля заявки, которые копируются в CargoAdmin/TruckAdmin
+ADMIN_PROJECTION_FIELDS = (
+    'sender_id', 'receiver_id', 'sent_at', 'accepted_at', 'finished_at', 'finished_by_id', 'archived_at', 'status',
+)
+
+
+class BookingConflict(APIException):
+    status_code = 409
+    default_detail = 'Заявка уже была изменена. Обновите страницу.'
+    default_code = 'conflict'
+
+
+def project_booking_to_admin(booking):
+    """
+    Переносит статус и даты заявки в архивные копии груза/машины одним UPDATE.
+    """
+    values = {field: getattr(booking, field) for field in ADMIN_PROJECTION_FIELDS}
+    if booking.cargo_id:
+        CargoAdmin.objects.filter(original_id=booking.cargo_id).update(**values)
+    if booking.truck_id:
+        TruckAdmin.objects.filter(original_id=booking.truck_id).update(**values)
+
+
+def transition_booking(booking, new_status):
+    """
+    Переводит заявку в new_status условным UPDATE ... WHERE status = <текущий>.
+    Неразрешённый переход (в т.ч. в тот же статус) — ValidationError (400);
+    если заявку успели изменить параллельно — BookingConflict (409).
+
+    UPDATE не шлёт post_save, поэтому архивные копии, availability, кэш
+    витрин и счётчики ящиков обновляются здесь, в той же транзакции.
+    """
+    old_status = booking.status
+    if new_status not in ALLOWED_TRANSITIONS.get(old_status, ()):
+        raise ValidationError({'status': f'Нельзя перевести заявку из {old_status} в {new_status}.'})
+
+    now = timezone.now()
+    changes = {'status': new_status, 'updated_at': now}
+    if new_status == 'Accepted':
+        changes['accepted_at'] = now
+    if new_status == 'Finished':
+        changes['finished_at'] = now
+        changes['finished_by_id'] = booking.finished_by_id or booking.receiver_id
+    if new_status in ('Finished', 'Cancelled'):
+        changes['archived_at'] = now
+
+    with transaction.atomic():
+        updated = BookingRequest.objects.filter(pk=booking.pk, status=old_status).update(**changes)
+        if not updated:
+            # Статус сменили между чтением и UPDATE — гонка, клиенту стоит обновить данные
+            raise BookingConflict()
+
+        for field, value in changes.items():
+            setattr(booking, field, value)
+        booking._loaded_status = new_status
+
+        project_booking_to_admin(booking)
+        refresh_listing_availability(cargo_id=booking.cargo_id, truck_id=booking.truck_id)
+        transaction.on_commit(bump_board_version)
+        transaction.on_commit(lambda: invalidate_inbox_counters(booking.sender_id, booking.receiver_id))
+
+    return booking
@@ -0,0 +1,149 @@
+import csv
+import io
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import BaseParser
+
+from .cache import bump_board_version
+from .models import CargoAdmin, TruckAdmin, OrderNumberCounter, ORDER_KIND_CARGO, ORDER_KIND_TRUCK
+from .serializers import CargoBulkSerializer, TruckBulkSerializer
+from .utils import get_company_code
+
+
+BULK_MAX_ROWS = 5000
+BULK_BATCH_SIZE = 500
+
+
+def read_csv_rows(text):
+    reader = csv.DictReader(io.StringIO(text))
+    rows = []
+    for row in reader:
+        # Пустая ячейка = поле не передано (иначе '' не пройдёт DateField/DecimalField)
+        rows.append({key.strip(): value for key, value in row.items() if key and value not in (None, '')})
+    return rows
+
+
+class CSVParser(BaseParser):
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            text = stream.read().decode(encoding).lstrip('\ufeff')
+        except UnicodeDecodeError as exc:
+            raise ParseError(f'CSV parse error - {exc}')
+        return read_csv_rows(text)
+
+
+def get_bulk_rows(request):
+    """
+    Строки импорта из тела запроса: JSON-массив, text/csv или CSV-файл в поле file.
+    """
+    upload = request.FILES.get('file')
+    if upload is not None:
+        try:
+            return read_csv_rows(upload.read().decode('utf-8-sig'))
+        except UnicodeDecodeError as exc:
+            raise ParseError(f'CSV parse error - {exc}')
+
+    rows = request.data
+    if not isinstance(rows, list):
+        raise ValidationError({'detail': 'Expected a list of rows or a CSV file.'})
+    return rows
+
+
+class BulkListingImport:
+    """
+    Массовое создание грузов/машин. Все строки валидируются одним ListSerializer,
+    номера заказов выделяются одним блоком, записи и их копии в *Admin
+    создаются через bulk_create. Если хоть одна строка с ошибкой (см. errors),
+    не создаётся ничего.
+
+    bulk_create не шлёт post_save, поэтому копии в *Admin и сброс кэша
+    витрин делаются здесь же.
+    """
+    serializer_class = None
+    admin_model = None
+    admin_fields = ()
+    order_kind = None
+    defaults = {}
+
+    def __init__(self, user):
+        self.user = user
+        self.errors = []
+        self.validated_rows = None
+
+    def is_valid(self, rows):
+        if not rows:
+            raise ValidationError({'detail': 'No rows to import.'})
+        if len(rows) > BULK_MAX_ROWS:
+            raise ValidationError({'detail': f'Too many rows: {len(rows)} (max {BULK_MAX_ROWS}).'})
+
+        serializer = self.serializer_class(data=rows, many=True)
+        if serializer.is_valid():
+            self.validated_rows = serializer.validated_data
+            return True
+
+        errors = serializer.errors
+        # Старые DRF отдают список по строкам, новые — dict {номер строки: ошибки}
+        if isinstance(errors, list):
+            errors = dict(enumerate(errors))
+        if not all(isinstance(index, int) for index in errors):
+            raise ValidationError(errors)
+
+        self.errors = [
+            {'row': index, 'errors': row_errors}
+            for index, row_errors in sorted(errors.items()) if row_errors
+        ]
+        return False
+
+    def save(self):
+        validated_rows = self.validated_rows
+
+        company_code = get_company_code(self.user)
+        if not company_code:
+            raise ValidationError({'detail': 'Не удалось получить код компании'})
+
+        model = self.serializer_class.Meta.model
+
+        with transaction.atomic():
+            order_numbers = OrderNumberCounter.allocate(company_code, self.order_kind, len(validated_rows))
+            objects = [
+                model(user=self.user, order_number=order_number, **self.defaults, **attrs)
+                for order_number, attrs in zip(order_numbers, validated_rows)
+            ]
+            model.objects.bulk_create(objects, batch_size=BULK_BATCH_SIZE)
+
+            self.admin_model.objects.bulk_create([
+                self.admin_model(
+                    original=obj,
+                    user=self.user,
+                    order_number=f"{obj.order_number}_1",
+                    created_at=obj.created_at,
+                    **{field: getattr(obj, field) for field in self.admin_fields}
+                )
+                for obj in objects
+            ], batch_size=BULK_BATCH_SIZE)
+
+            transaction.on_commit(bump_board_version)
+
+        return objects
+
+
+class CargoBulkImport(BulkListingImport):
+    serializer_class = CargoBulkSerializer
+    admin_model = CargoAdmin
+    admin_fields = ('loading_city_primary', 'unloading_city_primary')
+    order_kind = ORDER_KIND_CARGO
+    defaults = {'show_on_main': False, 'show_in_available_cargo': False}
+
+
+class TruckBulkImport(BulkListingImport):
+    serializer_class = TruckBulkSerializer
+    admin_model = TruckAdmin
+    admin_fields = ('loading_city', 'unloading_city')
+    order_kind = ORDER_KIND_TRUCK
+    defaults = {'show_on_main': False, 'show_in_available_vehicles': False}
@@ -0,0 +1,99 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import urlencode, quote_etag
+
+
+BOARD_VERSION_KEY = 'board:version'
+BOARD_CACHE_TIMEOUT = 300  # сек.; страховка, если счётчик версии где-то не подняли
+
+# Single-flight: пока один запрос пересчитывает витрину, остальные ждут его результат
+RECOMPUTE_LOCK_TIMEOUT = 10
+RECOMPUTE_WAIT = 2.0
+RECOMPUTE_POLL_INTERVAL = 0.05
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Стартуем с текущего времени в мс: если ключ вытеснили из кэша,
+        # новая версия всё равно окажется больше любой старой
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        get_version(key)
+
+
+def get_board_version():
+    return get_version(BOARD_VERSION_KEY)
+
+
+def bump_board_version():
+    bump_version(BOARD_VERSION_KEY)
+
+
+def board_cache_key(endpoint, request):
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    # Хост входит в ключ, потому что company_logo_url — абсолютный URL
+    raw = f'{request.get_host()}?{urlencode(params, doseq=True)}'
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'board:{endpoint}:{get_board_version()}:{digest}'
+
+
+def get_or_build(key, build, timeout=BOARD_CACHE_TIMEOUT):
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, RECOMPUTE_LOCK_TIMEOUT):
+        try:
+            data = build()
+            cache.set(key, data, timeout)
+        finally:
+            cache.delete(lock_key)
+        return data
+
+    # Кто-то уже считает эту витрину — ждём его результат
+    deadline = time.monotonic() + RECOMPUTE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(RECOMPUTE_POLL_INTERVAL)
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+    # Не дождались (упал или слишком долго) — считаем сами
+    return build()
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest())
+
+
+def board_etag(endpoint, request):
+    # Версия витрин меняется при любом изменении грузов/машин/заявок/профилей,
+    # поэтому ETag считается без запросов к БД. Пользователь — из-за поля status.
+    # Версию поднимают только после коммита (transaction.on_commit), и ETag
+    # читается до сборки ответа: тело может быть новее своего ETag (клиент
+    # просто получит 200 ещё раз), но никогда не старше.
+    user_id = request.user.pk if request.user.is_authenticated else 0
+    return make_etag(board_cache_key(endpoint, request), user_id)
+
+
+def not_modified_response(request, etag):
+    """
+    304 Not Modified, если If-None-Match совпал с etag, иначе None.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response['ETag'] = etag
+    return response
+
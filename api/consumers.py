@@ -1,24 +1,91 @@
 import json
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 
-from django.contrib.auth.models import User
+from api.auth.custom_jwt_auth import ClaimsJWTAuthentication
 from api.models import Profile
 
-from asgiref.sync import sync_to_async
+
+# Коды закрытия: клиенту не нужно переподключаться с тем же токеном
+CLOSE_UNAUTHORIZED = 4401   # нет токена, он неверный/истёк или пользователь деактивирован
+CLOSE_FORBIDDEN = 4403      # токен другого пользователя или уведомления выключены
+
+# Браузерный WebSocket не умеет заголовки: токен — в ?token=<jwt>
+# или в подпротоколах: new WebSocket(url, ['bearer', '<jwt>'])
+TOKEN_SUBPROTOCOL = 'bearer'
+
+
+def get_raw_token(scope):
+    """
+    (токен, подпротокол для accept) из query string или Sec-WebSocket-Protocol.
+    """
+    subprotocols = scope.get('subprotocols') or []
+    if TOKEN_SUBPROTOCOL in subprotocols:
+        index = subprotocols.index(TOKEN_SUBPROTOCOL)
+        if index + 1 < len(subprotocols):
+            return subprotocols[index + 1], TOKEN_SUBPROTOCOL
+
+    tokens = parse_qs(scope.get('query_string', b'').decode('latin1')).get('token')
+    return (tokens[0] if tokens else None), None
+
+
+@database_sync_to_async
+def authenticate(raw_token):
+    """
+    id пользователя по access-токену (как ClaimsJWTAuthentication в HTTP)
+    и его notifications_enabled. None вместо id — токен не принят.
+    """
+    authentication = ClaimsJWTAuthentication()
+    try:
+        user = authentication.get_user(authentication.get_validated_token(raw_token.encode()))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None, False
+    # Активность — по строке в БД, а не по claim: токен мог быть выдан до блокировки
+    notifications_enabled = (
+        Profile.objects.filter(user_id=user.pk, user__is_active=True)
+        .values_list('notifications_enabled', flat=True).first()
+    )
+    if notifications_enabled is None:
+        return None, False
+    return user.pk, notifications_enabled
 
 
 class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    Уведомления пользователя: ws/notifications/<user_id>/ с его access-токеном.
+    Подключение добавляется в группу user_<id>, куда пишет dispatch_notifications.
+    """
+
+    group_name = None
+
     async def connect(self):
-        self.user_id = self.scope['url_route']['kwargs']['user_id']
-        self.group_name = f"user_{self.user_id}"
+        raw_token, subprotocol = get_raw_token(self.scope)
+        user_id, notifications_enabled = await authenticate(raw_token) if raw_token else (None, False)
+
+        if user_id is None:
+            close_code = CLOSE_UNAUTHORIZED
+        elif str(user_id) != self.scope['url_route']['kwargs']['user_id'] or not notifications_enabled:
+            close_code = CLOSE_FORBIDDEN
+        else:
+            close_code = None
 
-        # Подключаемся к группе (по user_id)
+        if close_code is not None:
+            # Код закрытия доходит до клиента только после рукопожатия
+            await self.accept(subprotocol)
+            await self.close(code=close_code)
+            return
+
+        self.group_name = f"user_{user_id}"
         await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+        await self.accept(subprotocol)
 
     async def disconnect(self, close_code):
-        # Отключение от группы
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if self.group_name is not None:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
     async def receive(self, text_data):
         # Можно использовать, если клиент что-то отправляет (необязательно для уведомлений)
@@ -32,22 +99,3 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         await self.send(text_data=json.dumps({
             'message': message
         }))
-
-async def connect(self):
-    self.user_id = self.scope['url_route']['kwargs']['user_id']
-    self.group_name = f"user_{self.user_id}"
-
-    # 🔒 Проверяем разрешено ли подключение к WebSocket
-    try:
-        user = await sync_to_async(User.objects.get)(id=self.user_id)
-        profile = await sync_to_async(Profile.objects.get)(user=user)
-        if not profile.notifications_enabled:
-            await self.close()  # ⛔ Закрываем соединение
-            return
-    except Exception as e:
-        print(f"[WebSocket ERROR] {e}")
-        await self.close()
-        return
-
-    await self.channel_layer.group_add(self.group_name, self.channel_name)
-    await self.accept()
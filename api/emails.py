@@ -0,0 +1,90 @@
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+from .utils import backoff_delay
+
+
+logger = logging.getLogger(__name__)
+
+SEND_BATCH_SIZE = 50
+MAX_SEND_ATTEMPTS = 6
+RETRY_BASE_DELAY = 30      # сек.; дальше удваивается с каждой попыткой
+RETRY_MAX_DELAY = 3600
+
+
+def queue_email(subject, message, recipient_list, from_email=None):
+    """
+    Ставит письмо в очередь (OutgoingEmail) вместо send_mail: запрос не ждёт SMTP.
+    """
+    return OutgoingEmail.objects.create(
+        subject=str(subject),
+        body=str(message),
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(recipient_list),
+    )
+
+
+def send_queued_emails(batch_size=SEND_BATCH_SIZE):
+    """
+    Отправляет одну пачку писем через одно SMTP-соединение.
+    Возвращает количество обработанных (отправленных и неудачных) писем.
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        batch = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(sent_at__isnull=True, next_attempt_at__lte=now, attempts__lt=MAX_SEND_ATTEMPTS)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        sent, failed = [], []
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+            for email in batch:
+                message = EmailMessage(email.subject, email.body, email.from_email, email.to, connection=connection)
+                try:
+                    connection.send_messages([message])
+                except Exception as exc:
+                    email.attempts += 1
+                    email.next_attempt_at = timezone.now() + backoff_delay(email.attempts, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+                    email.last_error = repr(exc)[:1000]
+                    failed.append(email)
+                    # После ошибки SMTP-сессия может быть в неопределённом состоянии — переподключаемся
+                    connection.close()
+                    connection.open()
+                else:
+                    email.sent_at = timezone.now()
+                    sent.append(email)
+        except Exception as exc:
+            # Не удалось даже подключиться — вся оставшаяся пачка уходит на повтор
+            for email in batch:
+                if email in sent or email in failed:
+                    continue
+                email.attempts += 1
+                email.next_attempt_at = timezone.now() + backoff_delay(email.attempts, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+                email.last_error = repr(exc)[:1000]
+                failed.append(email)
+        finally:
+            connection.close()
+
+        if sent:
+            OutgoingEmail.objects.bulk_update(sent, ['sent_at'])
+        if failed:
+            OutgoingEmail.objects.bulk_update(failed, ['attempts', 'next_attempt_at', 'last_error'])
+
+    if sent:
+        logger.info("emails sent=%d failed=%d", len(sent), len(failed))
+    for email in failed:
+        level = logging.ERROR if email.attempts >= MAX_SEND_ATTEMPTS else logging.WARNING
+        logger.log(level, "email %s attempt %d failed: %s", email.id, email.attempts, email.last_error)
+
+    return len(batch)
@@ -0,0 +1,85 @@
+from django.core.cache import cache
+from django.db.models import Count, Q
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from .models import BookingRequest, Notification, TeamMember
+from .utils import get_user_company_and_role
+
+
+INBOX_BOXES = ('sent', 'received', 'active', 'archived')
+
+# Связи, которые читают BookingRequestSerializer и вложенные Cargo/TruckSerializer
+INBOX_SELECT_RELATED = ('sender__profile', 'receiver__profile', 'cargo__user__profile', 'truck__user__profile')
+
+INBOX_COUNTERS_TIMEOUT = 300  # сек.; страховка, основной сброс — сигналами
+
+
+def inbox_filter(box, user_id):
+    """
+    Условие ящика заявок — то же, что в sent/received/active/archived_requests_view.
+    """
+    if box == 'sent':
+        return Q(sender_id=user_id)
+    if box == 'received':
+        return Q(receiver_id=user_id, status='Waiting')
+    if box == 'active':
+        return Q(status='Accepted') & (Q(sender_id=user_id) | Q(receiver_id=user_id))
+    if box == 'archived':
+        # Заявку, удалённую у себя (soft delete), в архиве не показываем
+        return Q(status='Finished') & (
+            Q(sender_id=user_id, sender_deleted=False) |
+            Q(receiver_id=user_id, receiver_deleted=False)
+        )
+    raise ValueError(f'Unknown inbox box: {box}')
+
+
+def inbox_queryset(box, user_id):
+    return BookingRequest.objects.filter(inbox_filter(box, user_id)).select_related(*INBOX_SELECT_RELATED)
+
+
+def inbox_counters_key(user_id):
+    return f'inbox:counters:{user_id}'
+
+
+def get_inbox_counters(user_id):
+    """
+    Счётчики для бейджей: по ящикам заявок и непрочитанным уведомлениям.
+    Один агрегат на таблицу, результат кэшируется до изменения заявок/уведомлений.
+    """
+    key = inbox_counters_key(user_id)
+    counters = cache.get(key)
+    if counters is not None:
+        return counters
+
+    counters = BookingRequest.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id)).aggregate(**{
+        box: Count('id', filter=inbox_filter(box, user_id)) for box in INBOX_BOXES
+    })
+    counters['unread_notifications'] = Notification.objects.filter(receiver_id=user_id, is_read=False).count()
+
+    cache.set(key, counters, INBOX_COUNTERS_TIMEOUT)
+    return counters
+
+
+def invalidate_inbox_counters(*user_ids):
+    cache.delete_many([inbox_counters_key(user_id) for user_id in user_ids if user_id])
+
+
+def get_inbox_user_id(request):
+    """
+    Чей ящик смотреть: свой или, для owner/manager, сотрудника из ?user_id=.
+    """
+    user_id = request.query_params.get('user_id')
+    if not user_id:
+        return request.user.pk
+
+    try:
+        user_id = int(user_id)
+    except ValueError:
+        raise ValidationError({'user_id': 'Invalid user id'})
+
+    company, role = get_user_company_and_role(request.user)
+    if role not in ['owner', 'manager']:
+        raise PermissionDenied("Access denied")
+    if not TeamMember.objects.filter(company=company, user_id=user_id).exists():
+        raise PermissionDenied("User not in your team")
+    return user_id
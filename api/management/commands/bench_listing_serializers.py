@@ -0,0 +1,110 @@
+import datetime
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.models import Cargo, Profile, Truck
+from api.serializers import CargoRowSerializer, CargoSerializer, TruckRowSerializer, TruckSerializer
+
+
+def _owner(index):
+    user = User(id=index, username=f'user{index}', email=f'user{index}@example.com')
+    profile = Profile(
+        id=index,
+        company=f'Company {index}',
+        full_name=f'Contact {index}',
+        company_photo=f'company_photos/logo_{index}.png' if index % 2 else '',
+        company_photo_thumbnails={
+            'avatar': f'company_photos/thumbs/logo_{index}_avatar.webp',
+            'card': f'company_photos/thumbs/logo_{index}_card.webp',
+            'full': f'company_photos/thumbs/logo_{index}_full.webp',
+        } if index % 4 == 1 else {},
+    )
+    user.profile = profile
+    return user
+
+
+def _cargo(index, owner):
+    return Cargo(
+        id=index, user=owner, loading_city_primary='Zürich', loading_postal_primary='8001',
+        unloading_city_primary='Kyiv', unloading_postal_primary='01001', date_from=datetime.date(2025, 7, 1),
+        date_to=datetime.date(2025, 7, 5), cargo_type='Pallets', weight=Decimal('1200.50'),
+        volume=Decimal('33.00'), length=Decimal('13.60'), width=Decimal('2.45'), height=Decimal('2.70'),
+        transport_type='Tent', truck_count=1, price=Decimal('2500.00'), price_currency='CHF',
+        price_per_unit='total', extra_info='Loading with tail lift. ' * 10,
+        created_at=timezone.now(), loading_canton='ZH', phone_number='+41000000000',
+        show_on_main=True, order_number=f'C12345678{index:06d}',
+    )
+
+
+def _truck(index, owner):
+    return Truck(
+        id=index, user=owner, loading_date_from=datetime.date(2025, 7, 1), loading_date_to=datetime.date(2025, 7, 3),
+        loading_location='Bern', vehicle_type='Tent', loading_city='Bern', unloading_city='Lviv',
+        number_of_vehicles=2, carrying_capacity=20.0, useful_volume=90.0, length=13.6, width=2.45, height=2.7,
+        phone='+41000000000', has_gps=True, additional_info='GPS, ADR. ' * 10, created_at=timezone.now(),
+        price=Decimal('1800.00'), show_on_main=True, order_number=f'V12345678{index:06d}',
+    )
+
+
+def _as_row(obj):
+    # То же, что вернул бы ListingRowSerializer.project(...) для этой строки
+    row = {field.name: getattr(obj, field.attname) for field in obj._meta.concrete_fields}
+    profile = obj.user.profile
+    row.update({
+        'owner_username': obj.user.username,
+        'owner_profile_id': profile.id,
+        'owner_company': profile.company,
+        'owner_full_name': profile.full_name,
+        'owner_photo': profile.company_photo.name,
+        'owner_photo_thumbnails': profile.company_photo_thumbnails,
+    })
+    return row
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает CargoSerializer/TruckSerializer с быстрым выводом витрин по dict-строкам (без БД).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        request = Request(APIRequestFactory().get('/api/main-cargo/'))
+
+        cases = [
+            ('cargo', _cargo, CargoSerializer, CargoRowSerializer),
+            ('truck', _truck, TruckSerializer, TruckRowSerializer),
+        ]
+        for label, build, model_serializer, row_serializer in cases:
+            objects = [build(index, _owner(index)) for index in range(1, rows + 1)]
+            dict_rows = [_as_row(obj) for obj in objects]
+
+            def run_model():
+                return model_serializer(objects, many=True, context={'request': request}).data
+
+            def run_rows():
+                return row_serializer(request).serialize(dict_rows)
+
+            if [dict(item) for item in run_model()] != run_rows():
+                self.stderr.write(self.style.ERROR(f'{label}: outputs differ'))
+                continue
+
+            model_time = min(self._measure(run_model) for _ in range(repeat))
+            rows_time = min(self._measure(run_rows) for _ in range(repeat))
+            self.stdout.write(
+                f'{label}: {rows} rows — ModelSerializer {model_time * 1000:.1f} ms, '
+                f'values() rows {rows_time * 1000:.1f} ms, speedup x{model_time / rows_time:.1f}'
+            )
+
+    @staticmethod
+    def _measure(func):
+        started = time.perf_counter()
+        func()
+        return time.perf_counter() - started
@@ -0,0 +1,50 @@
+import time
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.token_views import EmailTokenObtainPairSerializer
+
+
+EMAIL = 'bench-login@example.com'
+PASSWORD = 'bench-login-Passw0rd'
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает прежний вход (get + authenticate дважды) с EmailBackend. Данные откатываются.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench-login', email=EMAIL, password=PASSWORD)
+
+            def run_previous():
+                # Как было в EmailTokenObtainPairSerializer.validate до EmailBackend
+                found = User.objects.get(email=EMAIL)
+                authenticate(username=found.username, password=PASSWORD)
+                authenticate(username=found.username, password=PASSWORD)
+
+            def run_email_backend():
+                serializer = EmailTokenObtainPairSerializer(data={'email': EMAIL, 'password': PASSWORD})
+                if not serializer.is_valid():
+                    raise RuntimeError(serializer.errors)
+
+            previous_time = min(self._measure(run_previous) for _ in range(repeat))
+            backend_time = min(self._measure(run_email_backend) for _ in range(repeat))
+            self.stdout.write(
+                f'login ({user.password.split("$")[1]} iterations): previous {previous_time * 1000:.1f} ms, '
+                f'EmailBackend {backend_time * 1000:.1f} ms, speedup x{previous_time / backend_time:.1f}'
+            )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _measure(func):
+        started = time.perf_counter()
+        func()
+        return time.perf_counter() - started
@@ -0,0 +1,141 @@
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+SERVERS = {
+    # Как было в Procfile: синхронные воркеры gunicorn
+    'wsgi': ['backend.wsgi:application'],
+    # Как сейчас: backend/gunicorn.conf.py с uvicorn-воркерами
+    'asgi': ['backend.asgi:application', '-c', 'backend/gunicorn.conf.py', '--access-logfile', '/dev/null'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест: поднимает gunicorn с WSGI и с ASGI-конфигом на одной и той же БД '
+        'и сравнивает пропускную способность и задержки на одном GET-эндпоинте.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/main-cargo/')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--servers', default='wsgi,asgi', help='Через запятую: wsgi, asgi')
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['servers'].split(',') if name.strip()]
+        unknown = set(names) - set(SERVERS)
+        if unknown:
+            raise CommandError(f'Неизвестные серверы: {", ".join(sorted(unknown))}')
+
+        for name in names:
+            port = self._free_port()
+            process = self._start(name, port, options['workers'])
+            try:
+                self._wait_ready(port, process)
+                # Прогрев: импорты, соединения с БД в каждом воркере
+                self._run_load(port, options['path'], options['concurrency'] * 2, options['concurrency'])
+                elapsed, latencies, errors = self._run_load(
+                    port, options['path'], options['requests'], options['concurrency']
+                )
+            finally:
+                shutdown = self._stop(process)
+
+            latencies.sort()
+            self.stdout.write(
+                f'{name}: {len(latencies)} ok, {errors} errors, {len(latencies) / elapsed:.1f} req/s, '
+                f'p50 {self._percentile(latencies, 50):.1f} ms, p95 {self._percentile(latencies, 95):.1f} ms, '
+                f'shutdown {shutdown:.2f} s'
+            )
+
+    @staticmethod
+    def _free_port():
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    @staticmethod
+    def _start(name, port, workers):
+        command = [
+            sys.executable, '-m', 'gunicorn', *SERVERS[name],
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'warning',
+        ]
+        return subprocess.Popen(command, cwd=settings.BASE_DIR, env=os.environ.copy())
+
+    @staticmethod
+    def _wait_ready(port, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'gunicorn завершился с кодом {process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'gunicorn не начал слушать порт {port} за {timeout} с')
+
+    @staticmethod
+    def _run_load(port, path, total, concurrency):
+        """
+        total GET-запросов в concurrency потоков, у каждого своё keep-alive соединение.
+        Возвращает (секунды, задержки успешных в мс, число ошибок).
+        """
+        local = threading.local()
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+
+        def request(_):
+            connection = getattr(local, 'connection', None)
+            if connection is None:
+                connection = local.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status < 500
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(request, range(total)))
+        return time.perf_counter() - started, latencies, errors[0]
+
+    @staticmethod
+    def _stop(process):
+        # Время от SIGTERM до выхода — то, что Heroku ждёт при деплое
+        started = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        return time.perf_counter() - started
+
+    @staticmethod
+    def _percentile(values, percent):
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(len(values) * percent / 100))]
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.resumable import SESSION_MAX_AGE, cleanup_upload_sessions
+
+
+class Command(BaseCommand):
+    help = 'Удаляет брошенные сессии возобновляемой загрузки документов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=SESSION_MAX_AGE, help='Возраст сессии в секундах')
+
+    def handle(self, *args, **options):
+        count = cleanup_upload_sessions(options['max_age'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {count} upload sessions'))
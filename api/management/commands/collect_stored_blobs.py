@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api.storage import BLOB_GRACE_PERIOD, collect_stored_blobs, collect_untracked_files, recount_stored_blobs
+
+
+class Command(BaseCommand):
+    help = 'Удаляет блобы медиа-хранилища, на которые больше нет ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=BLOB_GRACE_PERIOD, help='Сколько секунд блоб живёт без ссылок')
+        parser.add_argument('--recount', action='store_true', help='Сначала пересчитать ref_count по таблицам')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            fixed = recount_stored_blobs()
+            self.stdout.write(f'Fixed reference counts of {fixed} blobs')
+
+        removed = collect_stored_blobs(options['grace'])
+        untracked = collect_untracked_files(options['grace'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} blobs and {untracked} untracked files'))
@@ -0,0 +1,39 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.notifications import DISPATCH_BATCH_SIZE, dispatch_notifications, logger
+
+
+class Command(BaseCommand):
+    help = 'Отправляет уведомления из outbox (Notification) в channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно (для worker-процесса)')
+        parser.add_argument('--interval', type=float, default=1.0, help='Пауза, когда outbox пуст (сек.)')
+        parser.add_argument('--batch-size', type=int, default=DISPATCH_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Метрики доставки (lag, ошибки) — в лог воркера
+        if options['verbosity'] >= 1 and not logger.handlers:
+            logger.addHandler(logging.StreamHandler(self.stdout))
+            logger.setLevel(logging.INFO)
+
+        if not options['loop']:
+            total = 0
+            while True:
+                processed = dispatch_notifications(batch_size)
+                total += processed
+                if processed < batch_size:
+                    break
+            self.stdout.write(f'Processed {total} notifications')
+            return
+
+        while True:
+            processed = dispatch_notifications(batch_size)
+            # Полная пачка — в очереди, скорее всего, есть ещё, не спим
+            if processed < batch_size:
+                time.sleep(options['interval'])
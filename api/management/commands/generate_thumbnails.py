@@ -0,0 +1,39 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.thumbnails import THUMBNAIL_BATCH_SIZE, generate_thumbnails, logger
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры фото компаний (card, avatar, full)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно (для worker-процесса)')
+        parser.add_argument('--interval', type=float, default=5.0, help='Пауза, когда очередь пуста (сек.)')
+        parser.add_argument('--batch-size', type=int, default=THUMBNAIL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Обработанные профили и ошибки — в лог воркера
+        if options['verbosity'] >= 1 and not logger.handlers:
+            logger.addHandler(logging.StreamHandler(self.stdout))
+            logger.setLevel(logging.INFO)
+
+        if not options['loop']:
+            total = 0
+            while True:
+                processed = generate_thumbnails(batch_size)
+                total += processed
+                if processed < batch_size:
+                    break
+            self.stdout.write(f'Processed {total} profiles')
+            return
+
+        while True:
+            processed = generate_thumbnails(batch_size)
+            # Полная пачка — скорее всего, есть ещё, не спим
+            if processed < batch_size:
+                time.sleep(options['interval'])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.utils import rebuild_rating_summaries
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводки рейтингов (UserRatingSummary) по всем отзывам'
+
+    def handle(self, *args, **options):
+        count = rebuild_rating_summaries()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} rating summaries'))
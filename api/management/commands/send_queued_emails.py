@@ -0,0 +1,39 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.emails import SEND_BATCH_SIZE, send_queued_emails, logger
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди (OutgoingEmail)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно (для worker-процесса)')
+        parser.add_argument('--interval', type=float, default=1.0, help='Пауза, когда очередь пуста (сек.)')
+        parser.add_argument('--batch-size', type=int, default=SEND_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Отправленные и ошибки — в лог воркера
+        if options['verbosity'] >= 1 and not logger.handlers:
+            logger.addHandler(logging.StreamHandler(self.stdout))
+            logger.setLevel(logging.INFO)
+
+        if not options['loop']:
+            total = 0
+            while True:
+                processed = send_queued_emails(batch_size)
+                total += processed
+                if processed < batch_size:
+                    break
+            self.stdout.write(f'Processed {total} emails')
+            return
+
+        while True:
+            processed = send_queued_emails(batch_size)
+            # Полная пачка — в очереди, скорее всего, есть ещё, не спим
+            if processed < batch_size:
+                time.sleep(options['interval'])
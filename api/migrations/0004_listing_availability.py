@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _availability(statuses):
+    if statuses & {'Finished', 'Cancelled'}:
+        return 'closed'
+    accepted = 'Accepted' in statuses
+    rejected = 'Rejected' in statuses
+    if accepted and rejected:
+        return 'accepted_rejected'
+    if accepted:
+        return 'accepted'
+    if rejected:
+        return 'rejected'
+    return 'open'
+
+
+def backfill_availability(apps, schema_editor):
+    BookingRequest = apps.get_model('api', 'BookingRequest')
+
+    for model_name, booking_field in (('Cargo', 'cargo_id'), ('Truck', 'truck_id')):
+        model = apps.get_model('api', model_name)
+
+        statuses = {}
+        rows = BookingRequest.objects.filter(**{f'{booking_field}__isnull': False}).values_list(booking_field, 'status').distinct()
+        for pk, status in rows:
+            statuses.setdefault(pk, set()).add(status)
+
+        by_state = {}
+        for pk, item_statuses in statuses.items():
+            by_state.setdefault(_availability(item_statuses), []).append(pk)
+
+        for state, ids in by_state.items():
+            if state != 'open':
+                model.objects.filter(id__in=ids).update(availability=state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_search_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cargo',
+            name='availability',
+            field=models.CharField(choices=[('open', 'Open'), ('accepted', 'Accepted'), ('rejected', 'Rejected'), ('accepted_rejected', 'Accepted and rejected'), ('closed', 'Closed')], default='open', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='truck',
+            name='availability',
+            field=models.CharField(choices=[('open', 'Open'), ('accepted', 'Accepted'), ('rejected', 'Rejected'), ('accepted_rejected', 'Accepted and rejected'), ('closed', 'Closed')], default='open', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='cargo',
+            index=models.Index(condition=models.Q(('show_on_main', True)), fields=['availability', '-created_at'], name='cargo_main_avail_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cargo',
+            index=models.Index(condition=models.Q(('show_in_available_cargo', True)), fields=['availability', '-created_at'], name='cargo_board_avail_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truck',
+            index=models.Index(condition=models.Q(('show_on_main', True)), fields=['availability', '-created_at'], name='truck_main_avail_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truck',
+            index=models.Index(condition=models.Q(('show_in_available_vehicles', True)), fields=['availability', '-created_at'], name='truck_board_avail_idx'),
+        ),
+        migrations.RunPython(backfill_availability, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:34
+
+from django.db import migrations, models
+
+
+def _parse_order_number(order_number):
+    # C{код компании}{6 цифр}, у копий в CargoAdmin/TruckAdmin — ещё суффикс "_1"
+    base = order_number.split('_', 1)[0]
+    if len(base) < 8 or base[0] not in ('C', 'V') or not base[1:].isdigit():
+        return None
+    return base[1:-6], base[0], int(base[-6:])
+
+
+def seed_counters(apps, schema_editor):
+    OrderNumberCounter = apps.get_model('api', 'OrderNumberCounter')
+
+    last_values = {}
+    for model_name in ('Cargo', 'CargoAdmin', 'Truck', 'TruckAdmin'):
+        model = apps.get_model('api', model_name)
+        numbers = model.objects.exclude(order_number__isnull=True).values_list('order_number', flat=True)
+        for order_number in numbers.iterator():
+            parsed = _parse_order_number(order_number)
+            if parsed is None:
+                continue
+            company_code, kind, number = parsed
+            key = (company_code, kind)
+            last_values[key] = max(last_values.get(key, 0), number)
+
+    OrderNumberCounter.objects.bulk_create([
+        OrderNumberCounter(company_code=company_code, kind=kind, last_value=last_value)
+        for (company_code, kind), last_value in last_values.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_listing_availability'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNumberCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('company_code', models.CharField(max_length=20)),
+                ('kind', models.CharField(choices=[('C', 'Cargo'), ('V', 'Truck')], max_length=1)),
+                ('last_value', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company_code', 'kind'), name='unique_order_number_counter')],
+            },
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_rating_summaries(apps, schema_editor):
+    Review = apps.get_model('api', 'Review')
+    UserRatingSummary = apps.get_model('api', 'UserRatingSummary')
+
+    stars = {f'stars_{star}': models.Count('id', filter=models.Q(rating=star)) for star in range(1, 6)}
+    rows = Review.objects.values('target_user_id').annotate(
+        rating_sum=models.Sum('rating'), rating_count=models.Count('id'), **stars
+    )
+    UserRatingSummary.objects.bulk_create([
+        UserRatingSummary(user_id=row.pop('target_user_id'), **row) for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_booking_inbox_indexes'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRatingSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('stars_1', models.PositiveIntegerField(default=0)),
+                ('stars_2', models.PositiveIntegerField(default=0)),
+                ('stars_3', models.PositiveIntegerField(default=0)),
+                ('stars_4', models.PositiveIntegerField(default=0)),
+                ('stars_5', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_rating_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_outgoing_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='company_photo_thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='company_photo_thumbnails_source',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:53
+
+import os
+
+import api.models
+import api.storage
+from django.db import migrations, models
+
+
+def backfill_original_names(apps, schema_editor):
+    CompanyDocument = apps.get_model('api', 'CompanyDocument')
+    documents = list(CompanyDocument.objects.only('id', 'file'))
+    for document in documents:
+        document.original_name = os.path.basename(document.file.name or '')[:255]
+    CompanyDocument.objects.bulk_update(documents, ['original_name'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_company_document_upload_info'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('orphaned_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='companydocument',
+            name='original_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(backfill_original_names, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='companydocument',
+            name='file',
+            field=models.FileField(storage=api.storage.get_media_storage, upload_to=api.models.user_directory_path),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='company_photo',
+            field=models.ImageField(blank=True, null=True, storage=api.storage.get_media_storage, upload_to='company_photos/', validators=[api.models.validate_company_file]),
+        ),
+    ]
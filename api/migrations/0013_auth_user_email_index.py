@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Индекс по auth_user.email для входа по email (api/auth/backends.py).
+    Таблица принадлежит django.contrib.auth, поэтому индекс создаётся через SQL.
+    Уникальным не делаем: в старых данных могут быть повторы email.
+    """
+
+    dependencies = [
+        ('api', '0012_content_addressed_storage'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS api_auth_user_email_idx ON auth_user (email);',
+            'DROP INDEX IF EXISTS api_auth_user_email_idx;',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_auth_user_email_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='suspiciousattempt',
+            name='attempts',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='suspiciousattempt',
+            name='attempted_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_suspiciousattempt_attempts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookingrequest',
+            index=models.Index(fields=['sender', 'created_at'], name='booking_sender_created_idx'),
+        ),
+    ]
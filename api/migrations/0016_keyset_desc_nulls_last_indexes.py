@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+# (индекс, таблица, колонка) — nullable-поля сортировки поиска
+DESC_NULLS_LAST_INDEXES = [
+    ('cargo_price_desc_id_idx', 'api_cargo', 'price'),
+    ('cargo_weight_desc_id_idx', 'api_cargo', 'weight'),
+    ('truck_price_desc_id_idx', 'api_truck', 'price'),
+    ('truck_capacity_desc_id_idx', 'api_truck', 'carrying_capacity'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in DESC_NULLS_LAST_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({column} DESC NULLS LAST, id DESC);'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _table, _column in DESC_NULLS_LAST_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name};')
+
+
+class Migration(migrations.Migration):
+    """
+    Индексы (поле DESC NULLS LAST, id DESC) для сортировки по убыванию
+    nullable-полей в KeysetPagination: обратный проход индекса (поле, id)
+    даёт NULLS FIRST, и Postgres сортировал бы всю выборку.
+    Только для Postgres: SQLite не принимает NULLS LAST в CREATE INDEX.
+    """
+
+    dependencies = [
+        ('api', '0015_bookingrequest_sender_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -1,44 +1,131 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import FileExtensionValidator
 
 from django.core.exceptions import ValidationError
-from PIL import Image
-import os
 
 from django.db.models import Q, UniqueConstraint
 
 from .utils import get_company_code
+from .storage import get_media_storage, release_blobs, sync_blob_references
+from .uploads import CONTENT_TYPE_SVG, DOCUMENT_CONTENT_TYPES, PHOTO_MAX_SIZE, RASTER_CONTENT_TYPES, inspect_upload
 
 from django.utils import timezone
 from django.conf import settings
 
 
 
+# Состояние доступности груза/машины — пересчитывается при каждом изменении
+# заявок (см. refresh_listing_availability), чтобы витрины не делали
+# NOT IN по всей таблице BookingRequest.
+AVAILABILITY_OPEN = 'open'                            # заявок нет или только Waiting
+AVAILABILITY_ACCEPTED = 'accepted'                    # есть Accepted
+AVAILABILITY_REJECTED = 'rejected'                    # есть Rejected
+AVAILABILITY_ACCEPTED_REJECTED = 'accepted_rejected'  # есть и Accepted, и Rejected
+AVAILABILITY_CLOSED = 'closed'                        # есть Finished или Cancelled
+
+AVAILABILITY_CHOICES = [
+    (AVAILABILITY_OPEN, 'Open'),
+    (AVAILABILITY_ACCEPTED, 'Accepted'),
+    (AVAILABILITY_REJECTED, 'Rejected'),
+    (AVAILABILITY_ACCEPTED_REJECTED, 'Accepted and rejected'),
+    (AVAILABILITY_CLOSED, 'Closed'),
+]
+
+# Главная страница скрывает Finished/Cancelled/Rejected
+MAIN_PAGE_AVAILABILITY = [AVAILABILITY_OPEN, AVAILABILITY_ACCEPTED]
+# "Available Cargo/Vehicles" скрывает Finished/Cancelled/Accepted
+AVAILABLE_BOARD_AVAILABILITY = [AVAILABILITY_OPEN, AVAILABILITY_REJECTED]
+# Поиск скрывает только Finished/Cancelled
+SEARCH_AVAILABILITY = [
+    AVAILABILITY_OPEN, AVAILABILITY_ACCEPTED, AVAILABILITY_REJECTED, AVAILABILITY_ACCEPTED_REJECTED,
+]
+
+
+def availability_for_statuses(statuses):
+    statuses = set(statuses)
+    if statuses & {'Finished', 'Cancelled'}:
+        return AVAILABILITY_CLOSED
+
+    accepted = 'Accepted' in statuses
+    rejected = 'Rejected' in statuses
+    if accepted and rejected:
+        return AVAILABILITY_ACCEPTED_REJECTED
+    if accepted:
+        return AVAILABILITY_ACCEPTED
+    if rejected:
+        return AVAILABILITY_REJECTED
+    return AVAILABILITY_OPEN
+
+
 def validate_company_file(file):
-    max_size_mb = 2
-    valid_extensions = ['jpg', 'jpeg', 'png', 'webp', 'pdf', 'svg']
+    max_size_mb = PHOTO_MAX_SIZE // (1024 * 1024)
+    max_width, max_height = 1024, 1024
 
-    ext = os.path.splitext(file.name)[1][1:].lower()
-    
-    if ext == 'svg':
-        return  # ⬅️ SVG пропускаем из проверки PIL
+    # Тип — по сигнатуре, размеры — из заголовка (см. api/uploads.py), без декодирования
+    info = inspect_upload(file)
 
-    if ext not in valid_extensions:
+    if info.content_type == CONTENT_TYPE_SVG:
+        return  # ⬅️ SVG пропускаем из проверки размеров
+
+    if info.content_type not in DOCUMENT_CONTENT_TYPES:
         raise ValidationError("Дозволені формати: JPG, JPEG, PNG, WEBP, PDF.")
 
-    if file.size > max_size_mb * 1024 * 1024:
+    if info.truncated or info.size > PHOTO_MAX_SIZE:
         raise ValidationError(f"Розмір файлу не повинен перевищувати {max_size_mb}MB.")
 
     # Проверка разрешения только для изображений (не для SVG и PDF)
-    if ext in ['jpg', 'jpeg', 'png', 'webp']:
-        try:
-            image = Image.open(file)
-            max_width, max_height = 1024, 1024
-            if image.width > max_width or image.height > max_height:
-                raise ValidationError("Максимальні розміри зображення: 1024x1024 пікселів.")
-        except Exception:
+    if info.content_type in RASTER_CONTENT_TYPES:
+        if info.image_size is None:
             raise ValidationError("Файл має бути коректним зображенням або PDF.")
+        width, height = info.image_size
+        if width > max_width or height > max_height:
+            raise ValidationError("Максимальні розміри зображення: 1024x1024 пікселів.")
+
+
+ORDER_KIND_CARGO = 'C'
+ORDER_KIND_TRUCK = 'V'
+
+
+def format_order_number(kind, company_code, number):
+    return f"{kind}{company_code}{number:06d}"
+
+
+class OrderNumberCounter(models.Model):
+    """
+    Последний выданный номер заказа по (код компании, тип: C — грузы, V — машины).
+    Строка счётчика блокируется на время выдачи, так что параллельные
+    создания не получают одинаковые номера.
+    """
+    KIND_CHOICES = [
+        (ORDER_KIND_CARGO, 'Cargo'),
+        (ORDER_KIND_TRUCK, 'Truck'),
+    ]
+
+    company_code = models.CharField(max_length=20)
+    kind = models.CharField(max_length=1, choices=KIND_CHOICES)
+    last_value = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['company_code', 'kind'], name='unique_order_number_counter'),
+        ]
+
+    @classmethod
+    def allocate(cls, company_code, kind, count=1):
+        """
+        Резервирует count номеров подряд и возвращает их списком.
+        """
+        with transaction.atomic():
+            counter, _ = cls.objects.select_for_update().get_or_create(company_code=company_code, kind=kind)
+            first = counter.last_value + 1
+            counter.last_value += count
+            counter.save(update_fields=['last_value'])
+
+        return [format_order_number(kind, company_code, number) for number in range(first, first + count)]
+
+    def __str__(self):
+        return f"{self.kind}{self.company_code}: {self.last_value}"
 
 
 class Cargo(models.Model):
@@ -77,37 +164,28 @@ class Cargo(models.Model):
     hidden = models.BooleanField(default=False)  # ⬅️ Добавь это поле
     show_on_main = models.BooleanField(default=False)
     show_in_available_cargo = models.BooleanField(default=False)
+    availability = models.CharField(max_length=20, choices=AVAILABILITY_CHOICES, default=AVAILABILITY_OPEN)
 
     order_number = models.CharField(max_length=20, unique=True, blank=True, null=True)
 
-    def save(self, *args, **kwargs):
-        from .utils import get_company_code
-        from .models import CargoAdmin
+    class Meta:
+        # Индексы под сортировки поиска (keyset-пагинация по (поле, id))
+        indexes = [
+            models.Index(fields=['availability', '-created_at'], condition=Q(show_on_main=True), name='cargo_main_avail_idx'),
+            models.Index(fields=['availability', '-created_at'], condition=Q(show_in_available_cargo=True), name='cargo_board_avail_idx'),
+            models.Index(fields=['created_at', 'id'], name='cargo_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='cargo_price_id_idx'),
+            models.Index(fields=['date_from', 'id'], name='cargo_date_from_id_idx'),
+            models.Index(fields=['weight', 'id'], name='cargo_weight_id_idx'),
+        ]
 
+    def save(self, *args, **kwargs):
         if not self.order_number:
             company_code = get_company_code(self.user)
             if not company_code:
                 raise Exception("Не удалось получить код компании")
 
-            prefix = f"C{company_code}"
-
-            # Получаем последнее число из Cargo
-            last_cargo = Cargo.objects.filter(order_number__startswith=prefix).order_by('-id').first()
-            cargo_number = int(last_cargo.order_number[-6:]) if last_cargo and last_cargo.order_number else 0
-
-            # Получаем последнее число из CargoAdmin
-            last_admin = CargoAdmin.objects.filter(order_number__startswith=prefix).order_by('-id').first()
-            if last_admin and last_admin.order_number:
-                try:
-                    admin_number = int(last_admin.order_number[len(prefix):len(prefix)+6])
-                except:
-                    admin_number = 0
-            else:
-                admin_number = 0
-
-            # Берём максимальное число и увеличиваем
-            max_number = max(cargo_number, admin_number) + 1
-            self.order_number = f"{prefix}{max_number:06d}"
+            self.order_number = OrderNumberCounter.allocate(company_code, ORDER_KIND_CARGO)[0]
 
         super().save(*args, **kwargs)
 
@@ -153,36 +231,28 @@ class Truck(models.Model):
     hidden = models.BooleanField(default=False)
     show_on_main = models.BooleanField(default=False)
     show_in_available_vehicles = models.BooleanField(default=False)
+    availability = models.CharField(max_length=20, choices=AVAILABILITY_CHOICES, default=AVAILABILITY_OPEN)
     
     order_number = models.CharField(max_length=20, unique=True, blank=True, null=True)
 
-    def save(self, *args, **kwargs):
-        from .utils import get_company_code
-        from .models import TruckAdmin
+    class Meta:
+        # Индексы под сортировки поиска (keyset-пагинация по (поле, id))
+        indexes = [
+            models.Index(fields=['availability', '-created_at'], condition=Q(show_on_main=True), name='truck_main_avail_idx'),
+            models.Index(fields=['availability', '-created_at'], condition=Q(show_in_available_vehicles=True), name='truck_board_avail_idx'),
+            models.Index(fields=['created_at', 'id'], name='truck_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='truck_price_id_idx'),
+            models.Index(fields=['loading_date_from', 'id'], name='truck_loading_date_id_idx'),
+            models.Index(fields=['carrying_capacity', 'id'], name='truck_capacity_id_idx'),
+        ]
 
+    def save(self, *args, **kwargs):
         if not self.order_number:
             company_code = get_company_code(self.user)
             if not company_code:
                 raise Exception("Не удалось получить код компании")
 
-            prefix = f"V{company_code}"
-
-            # Последний номер из Truck
-            last_truck = Truck.objects.filter(order_number__startswith=prefix).order_by('-id').first()
-            truck_number = int(last_truck.order_number[-6:]) if last_truck and last_truck.order_number else 0
-
-            # Последний номер из TruckAdmin
-            last_admin = TruckAdmin.objects.filter(order_number__startswith=prefix).order_by('-id').first()
-            if last_admin and last_admin.order_number:
-                try:
-                    admin_number = int(last_admin.order_number[len(prefix):len(prefix)+6])
-                except:
-                    admin_number = 0
-            else:
-                admin_number = 0
-
-            max_number = max(truck_number, admin_number) + 1
-            self.order_number = f"{prefix}{max_number:06d}"
+            self.order_number = OrderNumberCounter.allocate(company_code, ORDER_KIND_TRUCK)[0]
 
         super().save(*args, **kwargs)
 
@@ -211,10 +281,15 @@ class Profile(models.Model):
 
     company_photo = models.ImageField(
         upload_to='company_photos/',
+        storage=get_media_storage,  # одинаковые фото (у всей команды) хранятся один раз
         blank=True,
         null=True,
         validators=[validate_company_file]
     )
+    # Миниатюры фото {avatar, card, full} -> путь в хранилище; строит воркер
+    # generate_thumbnails, source — имя фото, для которого они построены
+    company_photo_thumbnails = models.JSONField(default=dict, blank=True)
+    company_photo_thumbnails_source = models.CharField(max_length=255, blank=True, default='')
 
     # 🟢 Вот это — новое поле:
     notifications_enabled = models.BooleanField(default=True)
@@ -222,6 +297,41 @@ class Profile(models.Model):
     def __str__(self):
         return f'{self.user.username} Profile'
 
+    def blob_names(self):
+        # Файлы хранилища, на которые ссылается профиль (учёт ссылок — StoredBlob)
+        names = set(self.company_photo_thumbnails.values())
+        if self.company_photo.name:
+            names.add(self.company_photo.name)
+        return names
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'company_photo' in instance.__dict__ and 'company_photo_thumbnails' in instance.__dict__:
+            instance._loaded_blob_names = instance.blob_names()
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Миниатюры построены для другого фото (его заменили или удалили) — больше не подходят.
+        # Источник сбрасываем вместе с ними: иначе повторная загрузка того же файла
+        # (то же имя блоба) выглядела бы для generate_thumbnails уже обработанной
+        if self.company_photo_thumbnails_source != (self.company_photo.name or ''):
+            if self.company_photo_thumbnails:
+                from .thumbnails import delete_thumbnail_files
+
+                stale, storage = self.company_photo_thumbnails, self.company_photo.storage
+                transaction.on_commit(lambda: delete_thumbnail_files(storage, stale))
+            self.company_photo_thumbnails = {}
+            self.company_photo_thumbnails_source = ''
+
+        loaded_names = getattr(self, '_loaded_blob_names', None)
+        if loaded_names is None and not self._state.adding:
+            loaded_names = Profile.objects.get(pk=self.pk).blob_names()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            sync_blob_references(loaded_names or (), self.blob_names())
+        self._loaded_blob_names = self.blob_names()
+
 
 def user_directory_path(instance, filename):
     # файлы будут сохраняться, например: company_docs/user_7/название_файла.pdf
@@ -229,13 +339,51 @@ def user_directory_path(instance, filename):
 
 class CompanyDocument(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    file = models.FileField(upload_to=user_directory_path)  # вот здесь меняем
+    file = models.FileField(upload_to=user_directory_path, storage=get_media_storage)  # вот здесь меняем
+    original_name = models.CharField(max_length=255, blank=True, default='')  # имя файла у пользователя
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Считаются при приёме файла (StreamingUploadHandler), пусто у старых документов
+    sha256 = models.CharField(max_length=64, blank=True, default='')
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True, default='')
     is_approved = models.BooleanField(default=False)
     is_rejected = models.BooleanField(default=False)
 
     def __str__(self):
-        return f"{self.user.username} - {self.file.name}"
+        return f"{self.user.username} - {self.original_name or self.file.name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'file' in instance.__dict__:
+            instance._loaded_file_name = instance.file.name
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded_name = getattr(self, '_loaded_file_name', None)
+        if loaded_name is None and not self._state.adding:
+            loaded_name = CompanyDocument.objects.values_list('file', flat=True).get(pk=self.pk)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            sync_blob_references([loaded_name] if loaded_name else [], [self.file.name])
+        self._loaded_file_name = self.file.name
+
+class StoredBlob(models.Model):
+    """
+    Файл в хранилище с адресацией по содержимому (api/storage.py) и число
+    ссылок на него из Profile/CompanyDocument. Блобы без ссылок дольше льготного
+    срока удаляет manage.py collect_stored_blobs.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    orphaned_at = models.DateTimeField(null=True, blank=True, db_index=True)  # когда ссылок не стало
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
 
 class RegisteredCompany(models.Model):
     country = models.CharField(max_length=100)
@@ -251,7 +399,9 @@ class SuspiciousAttempt(models.Model):
     country = models.CharField(max_length=100)
     code = models.CharField(max_length=100)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    attempted_at = models.DateTimeField(auto_now_add=True)
+    # Первая попытка; повторы с того же IP копятся в attempts (см. api/throttling.py)
+    attempted_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=1)
 
     def __str__(self):
         return f"Attempt: {self.country} {self.code} ({self.ip_address})"
@@ -312,6 +462,21 @@ class BookingRequest(models.Model):
                 name='unique_active_truck_request'
             ),
         ]
+        # Ящики заявок (api/inbox.py): фильтр по отправителю/получателю и статусу, сортировка по дате;
+        # «Отправленные» — без статуса, им нужен свой индекс (sender, created_at)
+        indexes = [
+            models.Index(fields=['sender', 'status', 'created_at'], name='booking_sender_status_idx'),
+            models.Index(fields=['sender', 'created_at'], name='booking_sender_created_idx'),
+            models.Index(fields=['receiver', 'status', 'created_at'], name='booking_receiver_status_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Статус на момент загрузки — set_booking_timestamps сравнивает с ним без повторного SELECT
+        if 'status' in instance.__dict__:
+            instance._loaded_status = instance.status
+        return instance
 
 class Notification(models.Model):
     receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
@@ -319,9 +484,44 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Доставка по WebSocket — отдельным воркером (manage.py dispatch_notifications)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    delivery_attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at', 'id'], condition=Q(delivered_at__isnull=True), name='notification_pending_idx'),
+        ]
+
     def __str__(self):
         return f'📩 {self.receiver.username}: {self.message[:30]}'
 
+class OutgoingEmail(models.Model):
+    """
+    Исходящее письмо. Запросы только кладут письмо сюда (queue_email),
+    отправляет его воркер manage.py send_queued_emails.
+    """
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at', 'id'], condition=Q(sent_at__isnull=True), name='outgoing_email_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)}"
+
 class TeamCompany(models.Model):
     name = models.CharField(max_length=255)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owned_companies')
@@ -349,7 +549,7 @@ class TeamMember(models.Model):
         return f"{self.full_name} ({self.role}) – {self.company.name}"
 
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 @receiver(post_save, sender=User)
@@ -507,7 +707,80 @@ class Review(models.Model):
                 self.truck_type = self.booking.truck.vehicle_type
                 self.truck_price = self.booking.truck.price
 
-        super().save(*args, **kwargs)
-
-
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            # Сводка рейтинга меняется в той же транзакции, что и отзыв
+            previous = getattr(self, '_loaded_rating', None)
+            current = (self.target_user_id, self.rating)
+            if previous != current:
+                if previous:
+                    UserRatingSummary.apply(*previous, delta=-1)
+                UserRatingSummary.apply(*current, delta=1)
+            self._loaded_rating = current
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'target_user_id' in instance.__dict__ and 'rating' in instance.__dict__:
+            instance._loaded_rating = (instance.target_user_id, instance.rating)
+        return instance
+
+
+@receiver(post_delete, sender=Profile)
+@receiver(post_delete, sender=CompanyDocument)
+def release_deleted_blobs(sender, instance, **kwargs):
+    # Сами файлы не трогаем: их удалит collect_stored_blobs, если ссылок не осталось
+    if isinstance(instance, Profile):
+        release_blobs(instance.blob_names())
+    else:
+        release_blobs([instance.file.name])
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_rating_summary(sender, instance, **kwargs):
+    target_user_id, rating = getattr(instance, '_loaded_rating', (instance.target_user_id, instance.rating))
+    UserRatingSummary.apply(target_user_id, rating, delta=-1)
+
+
+class UserRatingSummary(models.Model):
+    """
+    Сводка отзывов о пользователе: сумма, количество и гистограмма по звёздам.
+    Поддерживается в Review.save / post_delete, пересчёт — manage.py rebuild_rating_summaries.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+
+    STAR_FIELDS = {1: 'stars_1', 2: 'stars_2', 3: 'stars_3', 4: 'stars_4', 5: 'stars_5'}
+
+    @property
+    def average(self):
+        # Округляем до 1 знака после запятой, как раньше в get_user_rating_data
+        return round(self.rating_sum / self.rating_count, 1) if self.rating_count else 0
+
+    @classmethod
+    def apply(cls, user_id, rating, delta):
+        """
+        Добавляет (delta=1) или убирает (delta=-1) одну оценку атомарным UPDATE.
+        """
+        changes = {
+            'rating_sum': models.F('rating_sum') + delta * rating,
+            'rating_count': models.F('rating_count') + delta,
+        }
+        star_field = cls.STAR_FIELDS.get(rating)
+        if star_field:
+            changes[star_field] = models.F(star_field) + delta
+
+        if cls.objects.filter(user_id=user_id).update(**changes) or delta < 0:
+            return
+        cls.objects.get_or_create(user_id=user_id)
+        cls.objects.filter(user_id=user_id).update(**changes)
 
+    def __str__(self):
+        return f"{self.user_id}: {self.average}★ ({self.rating_count})"
@@ -0,0 +1,108 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification, Profile
+from .utils import backoff_delay
+
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_BATCH_SIZE = 200
+MAX_DELIVERY_ATTEMPTS = 8
+RETRY_BASE_DELAY = 5       # сек.; дальше удваивается с каждой попыткой
+RETRY_MAX_DELAY = 600
+
+
+def send_notification_to_user(user_id, message):
+    """
+    Кладёт уведомление в outbox (таблица Notification). По WebSocket его
+    отправит dispatch_notifications, поэтому вызывать внутри той же транзакции,
+    что и изменение заявки.
+    """
+    notifications_enabled = Profile.objects.filter(user_id=user_id).values_list('notifications_enabled', flat=True).first()
+    if notifications_enabled is None:
+        logger.warning("Профиль не найден для user_id=%s", user_id)
+        return None
+    if not notifications_enabled:
+        return None  # ⛔ Уведомления отключены
+
+    return Notification.objects.create(receiver_id=user_id, message=message)
+
+
+def retry_delay(attempts):
+    return backoff_delay(attempts, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+
+
+async def _group_send_batch(channel_layer, notifications):
+    # Один event loop на всю пачку вместо async_to_sync на каждое сообщение
+    errors = []
+    for notification in notifications:
+        try:
+            await channel_layer.group_send(
+                f"user_{notification.receiver_id}",
+                {
+                    "type": "send_notification",
+                    "message": notification.message
+                }
+            )
+        except Exception as exc:
+            errors.append(exc)
+        else:
+            errors.append(None)
+    return errors
+
+
+def dispatch_notifications(batch_size=DISPATCH_BATCH_SIZE):
+    """
+    Отправляет одну пачку недоставленных уведомлений в channel layer.
+    Возвращает количество обработанных (доставленных и неудачных) записей.
+
+    Строки берутся с SKIP LOCKED, так что несколько воркеров не шлют
+    одно и то же. Неудачные откладываются с экспоненциальной задержкой.
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        batch = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(delivered_at__isnull=True, next_attempt_at__lte=now, delivery_attempts__lt=MAX_DELIVERY_ATTEMPTS)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        errors = async_to_sync(_group_send_batch)(get_channel_layer(), batch)
+
+        delivered_at = timezone.now()
+        delivered, failed = [], []
+        for notification, error in zip(batch, errors):
+            if error is None:
+                notification.delivered_at = delivered_at
+                delivered.append(notification)
+            else:
+                notification.delivery_attempts += 1
+                notification.next_attempt_at = delivered_at + retry_delay(notification.delivery_attempts)
+                notification.last_error = repr(error)[:1000]
+                failed.append(notification)
+
+        if delivered:
+            Notification.objects.bulk_update(delivered, ['delivered_at'])
+        if failed:
+            Notification.objects.bulk_update(failed, ['delivery_attempts', 'next_attempt_at', 'last_error'])
+
+    if delivered:
+        lags = [(n.delivered_at - n.created_at).total_seconds() for n in delivered]
+        logger.info(
+            "notifications delivered=%d failed=%d lag_avg=%.3fs lag_max=%.3fs",
+            len(delivered), len(failed), sum(lags) / len(lags), max(lags),
+        )
+    for notification in failed:
+        level = logging.ERROR if notification.delivery_attempts >= MAX_DELIVERY_ATTEMPTS else logging.WARNING
+        logger.log(level, "notification %s attempt %d failed: %s",
+                   notification.id, notification.delivery_attempts, notification.last_error)
+
+    return len(batch)
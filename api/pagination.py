@@ -0,0 +1,153 @@
+import base64
+import binascii
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _row_value(row, name):
+    # Строка может быть моделью или dict из .values()
+    if isinstance(row, dict):
+        return row[name]
+    return getattr(row, name)
+
+
+def _encode_value(value):
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()  # без обрезки микросекунд
+    return value
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная пагинация без OFFSET: следующая страница выбирается условием
+    (поле, id) > (последнее значение, последний id).
+
+    Поле сортировки берётся из view.get_ordering() (например '-price'),
+    id — тай-брейкер. NULL-значения всегда идут в конце.
+    """
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    default_ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(view)
+        self.field_name = self.ordering.lstrip('-')
+        self.descending = self.ordering.startswith('-')
+        self.field = queryset.model._meta.get_field(self.field_name)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_cursor_filter(*position))
+
+        queryset = queryset.order_by(*self.get_order_by())
+
+        # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        self.next_position = None
+        if self.has_next and rows:
+            last = rows[-1]
+            self.next_position = (_row_value(last, self.field_name), _row_value(last, 'id'))
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, view):
+        if view is not None and hasattr(view, 'get_ordering'):
+            return view.get_ordering()
+        return self.default_ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_order_by(self):
+        # NULLS LAST — только для nullable-полей: для остальных это лишь мешает
+        # Postgres пройти индекс (поле, id) в обратную сторону
+        if not self.field.null:
+            return [f'-{self.field_name}', '-id'] if self.descending else [self.field_name, 'id']
+        # ASC NULLS LAST — порядок индекса (поле, id); под DESC NULLS LAST —
+        # отдельные индексы на Postgres (миграция 0016)
+        if self.descending:
+            return [F(self.field_name).desc(nulls_last=True), '-id']
+        return [F(self.field_name).asc(nulls_last=True), 'id']
+
+    def get_cursor_filter(self, value, pk):
+        name = self.field_name
+        after = 'lt' if self.descending else 'gt'
+
+        if value is None:
+            # Уже внутри «хвоста» из NULL — двигаемся только по id
+            return Q(**{f'{name}__isnull': True, f'id__{after}': pk})
+
+        condition = Q(**{f'{name}__{after}': value}) | Q(**{name: value, f'id__{after}': pk})
+        if self.field.null:
+            condition |= Q(**{f'{name}__isnull': True})
+        return condition
+
+    def encode_cursor(self, value, pk):
+        payload = {'o': self.ordering, 'v': _encode_value(value), 'id': pk}
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if payload['o'] != self.ordering:
+                raise ValueError('ordering mismatch')
+            pk = int(payload['id'])
+            value = payload['v']
+            if value is not None:
+                value = self.field.to_python(value)
+        except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return value, pk
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(*self.next_position))
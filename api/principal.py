@@ -0,0 +1,123 @@
+from django.core.cache import cache
+
+from .cache import bump_version, get_version
+from .models import RegisteredCompany, TeamCompany, TeamMember
+
+
+PRINCIPAL_CACHE_TIMEOUT = 3600
+
+
+class PrincipalContext:
+    """
+    Компания пользователя и его роль в ней: владелец команды, участник команды,
+    владелец зарегистрированной компании. Считается тремя запросами один раз,
+    дальше берётся из кэша (см. get_principal).
+    """
+
+    def __init__(self, user_id=None, owned_team_company=None, team_member=None, owned_registered_company=None):
+        self.user_id = user_id
+        self.owned_team_company = owned_team_company
+        self.team_member = team_member  # с company и company.registered_company
+        self.owned_registered_company = owned_registered_company
+
+    @classmethod
+    def load(cls, user):
+        return cls(
+            user_id=user.pk,
+            owned_team_company=TeamCompany.objects.filter(created_by=user).first(),
+            team_member=TeamMember.objects.select_related('company__registered_company').filter(user=user).first(),
+            owned_registered_company=RegisteredCompany.objects.filter(registered_by=user).first(),
+        )
+
+    @property
+    def company(self):
+        # Как в get_user_company_and_role: сначала своя команда, потом членство
+        if self.owned_team_company:
+            return self.owned_team_company
+        if self.team_member:
+            return self.team_member.company
+        return None
+
+    @property
+    def role(self):
+        if self.owned_team_company:
+            return 'owner'
+        if self.team_member:
+            return self.team_member.role  # 'manager' или 'worker'
+        return None
+
+    @property
+    def member_registered_company(self):
+        if self.team_member:
+            return self.team_member.company.registered_company
+        return None
+
+    @property
+    def registered_company(self):
+        # Как в get_company_code: сначала своя компания, потом компания команды
+        return self.owned_registered_company or self.member_registered_company
+
+    @property
+    def company_code(self):
+        registered = self.registered_company
+        if registered:
+            return ''.join(filter(str.isdigit, registered.code))  # только цифры
+        return None
+
+
+def principal_cache_key(user_id, version):
+    return f'principal:{version}:{user_id}'
+
+
+def principal_version_key(user_id):
+    # Версия своя у каждого пользователя: правка одной команды не сбрасывает кэш остальным
+    return f'principal:version:{user_id}'
+
+
+def get_principal(user):
+    """
+    PrincipalContext пользователя. Запоминается на самом объекте user (в запросе это
+    request.user, повторный вызов — только чтение версии), а между запросами
+    хранится в кэше под версией пользователя, которую поднимают сигналы
+    TeamMember/TeamCompany/RegisteredCompany (см. principal_user_ids).
+    """
+    if user is None or not user.is_authenticated:
+        return PrincipalContext()
+
+    version = get_version(principal_version_key(user.pk))
+    # vars(): у ClaimsUser getattr/setattr подгрузили бы самого пользователя
+    memo = vars(user).get('_principal_context')
+    if memo is not None and memo[0] == version:
+        return memo[1]
+
+    key = principal_cache_key(user.pk, version)
+    principal = cache.get(key)
+    if principal is None:
+        principal = PrincipalContext.load(user)
+        cache.set(key, principal, PRINCIPAL_CACHE_TIMEOUT)
+
+    vars(user)['_principal_context'] = (version, principal)
+    return principal
+
+
+def principal_user_ids(instance):
+    """
+    Пользователи, чей PrincipalContext зависит от instance: участник команды;
+    владелец и участники команды; владелец зарегистрированной компании и
+    участники команды, привязанной к ней.
+    """
+    if isinstance(instance, TeamMember):
+        return {instance.user_id}
+    if isinstance(instance, TeamCompany):
+        members = TeamMember.objects.filter(company_id=instance.pk).values_list('user_id', flat=True)
+        return {instance.created_by_id, *members}
+    if isinstance(instance, RegisteredCompany):
+        members = TeamMember.objects.filter(company__registered_company_id=instance.pk).values_list('user_id', flat=True)
+        return {instance.registered_by_id, *members}
+    return set()
+
+
+def bump_principal_versions(user_ids):
+    for user_id in user_ids:
+        if user_id is not None:
+            bump_version(principal_version_key(user_id))
@@ -0,0 +1,214 @@
+import fcntl
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+
+from .uploads import DOCUMENT_MAX_SIZE
+
+
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024   # максимум тела одного PUT
+READ_BLOCK_SIZE = 64 * 1024           # столько читаем из запроса и пишем за раз
+SESSION_MAX_AGE = 24 * 3600           # незавершённые сессии старше — удаляются
+MAX_ACTIVE_SESSIONS = 10              # незавершённых сессий на пользователя
+
+SESSION_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadOffsetConflict(APIException):
+    status_code = 409
+    default_detail = 'Неверное смещение. Продолжите загрузку с текущего offset.'
+    default_code = 'offset_conflict'
+
+
+class TooManyUploadSessions(APIException):
+    status_code = 429
+    default_detail = f'Не больше {MAX_ACTIVE_SESSIONS} незавершённых загрузок. Завершите или отмените старые.'
+    default_code = 'too_many_upload_sessions'
+
+
+class ChunkTooLarge(APIException):
+    status_code = 413
+    default_detail = f'Один кусок — не больше {UPLOAD_CHUNK_SIZE} байт.'
+    default_code = 'chunk_too_large'
+
+
+def get_sessions_root():
+    return getattr(settings, 'RESUMABLE_UPLOAD_ROOT', os.path.join(settings.BASE_DIR, 'upload_sessions'))
+
+
+class UploadSession:
+    """
+    Незавершённая загрузка одного файла. Состояние лежит на диске:
+    <root>/<id>/meta.json (владелец, имя, заявленный размер) и <id>/data —
+    уже принятые байты. Текущий offset — это размер data, так что после
+    обрыва или рестарта процесса загрузка продолжается с того же места.
+    """
+
+    def __init__(self, session_id, user_id, filename, size, created_at):
+        self.id = session_id
+        self.user_id = user_id
+        self.filename = filename
+        self.size = size
+        self.created_at = created_at
+
+    @property
+    def directory(self):
+        return os.path.join(get_sessions_root(), self.id)
+
+    @property
+    def data_path(self):
+        return os.path.join(self.directory, 'data')
+
+    @property
+    def offset(self):
+        try:
+            return os.path.getsize(self.data_path)
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
+    @classmethod
+    def create(cls, user_id, filename, size):
+        filename = os.path.basename(str(filename or '').replace('\\', '/'))
+        if not filename:
+            raise ValidationError({'filename': 'Обязательное поле.'})
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            raise ValidationError({'size': 'Ожидается размер файла в байтах.'})
+        if size <= 0 or size > DOCUMENT_MAX_SIZE:
+            raise ValidationError({'size': f'Размер файла — от 1 до {DOCUMENT_MAX_SIZE} байт.'})
+
+        root = get_sessions_root()
+        os.makedirs(root, exist_ok=True)
+        # Подсчёт и создание — под блокировкой пользователя, иначе параллельные
+        # запросы вместе превысят лимит
+        with open(os.path.join(root, f'.user-{user_id}.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if count_active_sessions(user_id) >= MAX_ACTIVE_SESSIONS:
+                raise TooManyUploadSessions()
+            session = cls(uuid.uuid4().hex, user_id, filename, size, time.time())
+            os.makedirs(session.directory)
+            open(session.data_path, 'wb').close()
+            session.write_meta()
+        return session
+
+    @classmethod
+    def load(cls, session_id, user_id):
+        # Чужие и несуществующие сессии неотличимы — 404
+        if not SESSION_ID_RE.match(session_id or ''):
+            raise NotFound()
+        try:
+            with open(os.path.join(get_sessions_root(), session_id, 'meta.json')) as fh:
+                meta = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            raise NotFound()
+        if meta['user_id'] != user_id:
+            raise NotFound()
+        return cls(session_id, meta['user_id'], meta['filename'], meta['size'], meta['created_at'])
+
+    def write_meta(self):
+        meta = {'user_id': self.user_id, 'filename': self.filename, 'size': self.size, 'created_at': self.created_at}
+        tmp_path = os.path.join(self.directory, 'meta.json.tmp')
+        with open(tmp_path, 'w') as fh:
+            json.dump(meta, fh)
+        os.replace(tmp_path, os.path.join(self.directory, 'meta.json'))
+
+    def append(self, offset, stream, length):
+        """
+        Дописывает length байт из stream, если offset совпадает с уже принятым.
+        Читает и пишет блоками READ_BLOCK_SIZE, так что память не зависит от размера куска.
+        """
+        if length > UPLOAD_CHUNK_SIZE:
+            raise ChunkTooLarge()
+        if offset + length > self.size:
+            raise ValidationError({'detail': 'Кусок выходит за заявленный размер файла.'})
+
+        with open(self.data_path, 'ab') as fh:
+            # Параллельный PUT той же сессии ждёт, а потом получит 409
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                current = os.fstat(fh.fileno()).st_size
+                if offset != current:
+                    raise UploadOffsetConflict()
+
+                remaining = length
+                while remaining:
+                    block = stream.read(min(READ_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    fh.write(block)
+                    remaining -= len(block)
+                fh.flush()
+                os.fsync(fh.fileno())
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+        # Оборванный запрос оставляет принятые байты: клиент продолжит с нового offset
+        return self.offset
+
+    def open_file(self):
+        return File(open(self.data_path, 'rb'), name=self.filename)
+
+    def delete(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def to_dict(self):
+        return {'id': self.id, 'filename': self.filename, 'size': self.size, 'offset': self.offset,
+                'chunk_size': UPLOAD_CHUNK_SIZE}
+
+
+def count_active_sessions(user_id, max_age=SESSION_MAX_AGE):
+    """
+    Сессии пользователя с активностью за последние max_age секунд: брошенные, но ещё не
+    удалённые cleanup_upload_sessions в лимит не входят.
+    """
+    root = get_sessions_root()
+    deadline = time.time() - max_age
+    count = 0
+    for name in os.listdir(root):
+        if not SESSION_ID_RE.match(name):
+            continue
+        try:
+            with open(os.path.join(root, name, 'meta.json')) as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        if meta['user_id'] == user_id and last_activity(os.path.join(root, name)) >= deadline:
+            count += 1
+    return count
+
+
+def last_activity(directory):
+    # Последняя активность — последний принятый кусок
+    paths = [os.path.join(directory, 'data'), os.path.join(directory, 'meta.json')]
+    return max((os.path.getmtime(path) for path in paths if os.path.exists(path)), default=0)
+
+
+def cleanup_upload_sessions(max_age=SESSION_MAX_AGE):
+    """
+    Удаляет брошенные сессии старше max_age секунд. Возвращает их количество.
+    """
+    root = get_sessions_root()
+    if not os.path.isdir(root):
+        return 0
+
+    deadline = time.time() - max_age
+    removed = 0
+    for name in os.listdir(root):
+        directory = os.path.join(root, name)
+        if not SESSION_ID_RE.match(name) or not os.path.isdir(directory):
+            continue
+        if last_activity(directory) < deadline:
+            shutil.rmtree(directory, ignore_errors=True)
+            removed += 1
+    return removed
@@ -1,6 +1,14 @@
 
+import decimal
+import operator
+
 from django.contrib.auth.models import User
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework import ISO_8601
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from django.core.files.storage import FileSystemStorage
 from .models import Cargo, Profile, Truck, CompanyDocument
 
 from .models import BookingRequest
@@ -9,9 +17,90 @@ from django.db import IntegrityError
 from rest_framework.exceptions import ValidationError
 
 from .models import Notification
+from .storage import ContentAddressedStorage
+from .thumbnails import get_thumbnail_urls
 
 from .models import TeamCompany, TeamMember
 
+from django.db import models
+from django.db.models import Q
+
+
+class BookingStatusResolver:
+    """
+    Считает статус бронирования (поле status в CargoSerializer/TruckSerializer)
+    для текущего пользователя сразу для набора грузов/машин — одним запросом.
+    """
+    # Пользователь — владелец груза/машины
+    OWNER_LABELS = {'Finished': 'Finished', 'Accepted': 'In Process'}
+    # Пользователь — отправитель заявки
+    SENDER_LABELS = {'Waiting': 'Booked', 'Accepted': 'In Process', 'Rejected': 'Rejected', 'Finished': 'Finished'}
+
+    def __init__(self, target):
+        self.field = f'{target}_id'  # 'cargo_id' или 'truck_id'
+
+    def resolve(self, items, user):
+        """
+        items — пары (id груза/машины, id владельца). Возвращает {id: статус}.
+        """
+        if not user or user.is_anonymous:
+            return {}
+
+        owned, foreign = [], []
+        for pk, owner_id in items:
+            (owned if owner_id == user.pk else foreign).append(pk)
+
+        condition = Q()
+        if owned:
+            condition |= Q(**{f'{self.field}__in': owned, 'status__in': list(self.OWNER_LABELS)})
+        if foreign:
+            condition |= Q(**{f'{self.field}__in': foreign, 'sender_id': user.pk}) & ~Q(status='Cancelled')
+        if not condition:
+            return {}
+
+        owned = set(owned)
+        statuses = {}
+        # Как и раньше, решает самая ранняя подходящая заявка
+        rows = BookingRequest.objects.filter(condition).order_by('id').values_list(self.field, 'status')
+        for pk, booking_status in rows:
+            if pk in statuses:
+                continue
+            labels = self.OWNER_LABELS if pk in owned else self.SENDER_LABELS
+            statuses[pk] = labels.get(booking_status)
+        return statuses
+
+
+class BookingStatusListSerializer(serializers.ListSerializer):
+    """
+    many=True для CargoSerializer/TruckSerializer: статусы всей страницы
+    подгружаются заранее, get_status берёт их из словаря.
+    """
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(iterable)
+
+        self.child.booking_statuses = self.child.resolve_booking_statuses(items)
+        try:
+            return [self.child.to_representation(item) for item in items]
+        finally:
+            self.child.booking_statuses = None
+
+
+class BookingStatusMixin:
+    status_resolver = None
+    booking_statuses = None
+
+    def resolve_booking_statuses(self, items):
+        request = self.context.get('request')
+        user = request.user if request else None
+        return self.status_resolver.resolve([(item.pk, item.user_id) for item in items], user)
+
+    def get_status(self, obj):
+        statuses = self.booking_statuses
+        if statuses is None:
+            statuses = self.resolve_booking_statuses([obj])
+        return statuses.get(obj.pk)
+
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -40,14 +129,18 @@ class UserSerializer(serializers.ModelSerializer):
         return User.objects.create_user(**validated_data)
         
 
-class CargoSerializer(serializers.ModelSerializer):
+class CargoSerializer(BookingStatusMixin, serializers.ModelSerializer):
     company_name = serializers.SerializerMethodField()
     contact_name = serializers.SerializerMethodField()
     company_logo_url = serializers.SerializerMethodField()  # 👈
+    company_logo_thumbnails = serializers.SerializerMethodField()
+
+    status_resolver = BookingStatusResolver('cargo')
 
     class Meta:
         model = Cargo
         fields = '__all__'
+        list_serializer_class = BookingStatusListSerializer
 
     def get_company_name(self, obj):
         if obj.user and hasattr(obj.user, 'profile') and obj.user.profile and obj.user.profile.company:
@@ -65,48 +158,27 @@ class CargoSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.user.profile.company_photo.url) if request else obj.user.profile.company_photo.url
         return None
 
-    status = serializers.SerializerMethodField()  # 👈 ДОБАВЬ ЭТУ СТРОКУ
-
-    def get_status(self, obj):
-        user = self.context.get('request').user
-        if not user or user.is_anonymous:
-            return None
-
-        # Если пользователь — ВЛАДЕЛЕЦ груза
-        if obj.user == user:
-            # Проверяем все заявки на этот груз
-            bookings = BookingRequest.objects.filter(cargo=obj).exclude(status__in=["Cancelled", "Rejected"])
-            for booking in bookings:
-                if booking.status == "Finished":
-                    return "Finished"
-                elif booking.status == "Accepted":
-                    return "In Process"
-            return None
-
-        # Если пользователь — ОТПРАВИТЕЛЬ заявки
-        booking = BookingRequest.objects.filter(cargo=obj, sender=user).exclude(status="Cancelled").first()
-        if booking:
-            if booking.status == "Waiting":
-                return "Booked"
-            elif booking.status == "Accepted":
-                return "In Process"
-            elif booking.status == "Rejected":
-                return "Rejected"
-            elif booking.status == "Finished":
-                return "Finished"
-
+    def get_company_logo_thumbnails(self, obj):
+        if obj.user and hasattr(obj.user, 'profile'):
+            return get_thumbnail_urls(obj.user.profile, self.context.get('request'))
         return None
 
+    status = serializers.SerializerMethodField()  # 👈 считается в BookingStatusMixin.get_status
+
 
 
-class TruckSerializer(serializers.ModelSerializer):
+class TruckSerializer(BookingStatusMixin, serializers.ModelSerializer):
     company_name = serializers.SerializerMethodField()
     contact_name = serializers.SerializerMethodField()
     company_logo_url = serializers.SerializerMethodField()  # 👈
+    company_logo_thumbnails = serializers.SerializerMethodField()
+
+    status_resolver = BookingStatusResolver('truck')
 
     class Meta:
         model = Truck
         fields = '__all__'
+        list_serializer_class = BookingStatusListSerializer
 
     def get_company_name(self, obj):
         if obj.user and hasattr(obj.user, 'profile') and obj.user.profile and obj.user.profile.company:
@@ -124,41 +196,241 @@ class TruckSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.user.profile.company_photo.url) if request else obj.user.profile.company_photo.url
         return None
 
-    status = serializers.SerializerMethodField()
+    def get_company_logo_thumbnails(self, obj):
+        if obj.user and hasattr(obj.user, 'profile'):
+            return get_thumbnail_urls(obj.user.profile, self.context.get('request'))
+        return None
 
-    def get_status(self, obj):
-        user = self.context.get('request').user
-        if not user or user.is_anonymous:
+    status = serializers.SerializerMethodField()  # считается в BookingStatusMixin.get_status
+
+
+# Строки bulk-импорта (см. api/bulk.py): владельца, номер заказа и флаги
+# витрин проставляет сервер, как в perform_create у CargoViewSet/TruckViewSet
+class CargoBulkSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Cargo
+        exclude = ['user', 'order_number', 'availability', 'show_on_main', 'show_in_available_cargo']
+
+
+class TruckBulkSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Truck
+        exclude = ['user', 'order_number', 'availability', 'show_on_main', 'show_in_available_vehicles']
+
+
+
+class ListingRowSerializer:
+    """
+    Быстрый read-only вывод для витрин. Работает с dict-строками из .values()
+    (поля профиля владельца подтягиваются тем же запросом через JOIN)
+    и отдаёт ровно тот же JSON, что и model_serializer_class.
+    """
+    model_serializer_class = None
+
+    # Поля владельца, которые нужны для company_name / contact_name / company_logo_url
+    owner_fields = {
+        'owner_username': 'user__username',
+        'owner_profile_id': 'user__profile__id',
+        'owner_company': 'user__profile__company',
+        'owner_full_name': 'user__profile__full_name',
+        'owner_photo': 'user__profile__company_photo',
+        'owner_photo_thumbnails': 'user__profile__company_photo_thumbnails',
+    }
+
+    # ?include=rating — рейтинг владельца из UserRatingSummary тем же запросом (LEFT JOIN)
+    rating_fields = {
+        'owner_rating_sum': 'user__rating_summary__rating_sum',
+        'owner_rating_count': 'user__rating_summary__rating_count',
+    }
+
+    _layout = None
+
+    def __init__(self, request=None, include_rating=None):
+        self.request = request
+        self.photo_storage = Profile._meta.get_field('company_photo').storage
+        self.logo_urls = {}
+        if include_rating is None:
+            include = request.query_params.get('include', '') if request is not None else ''
+            include_rating = 'rating' in include.split(',')
+        self.include_rating = include_rating
+
+    @classmethod
+    def get_layout(cls):
+        # Порядок и типы полей берём у обычного сериализатора один раз
+        if cls.__dict__.get('_layout') is None:
+            cls._layout = [
+                (name, field) for name, field in cls.model_serializer_class().fields.items()
+            ]
+        return cls._layout
+
+    def get_value_getters(self):
+        """
+        Для каждого поля — функция row -> значение в JSON, с тем же
+        форматированием, что у полей DRF (Decimal → str, даты → ISO 8601).
+        """
+        getters = []
+        for name, field in self.get_layout():
+            if isinstance(field, serializers.SerializerMethodField):
+                getters.append((name, getattr(self, f'get_{name}')))
+                continue
+
+            formatter = self.get_formatter(field)
+            if formatter is None:
+                getters.append((name, operator.itemgetter(name)))
+            else:
+                getters.append((name, self.formatted_getter(name, formatter)))
+        return getters
+
+    @staticmethod
+    def formatted_getter(name, formatter):
+        def getter(row):
+            value = row[name]
+            return None if value is None else formatter(value)
+        return getter
+
+    @staticmethod
+    def get_formatter(field):
+        if isinstance(field, serializers.DecimalField):
+            coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+            if not coerce_to_string or field.normalize_output or field.localize or field.decimal_places is None:
+                return field.to_representation
+            # Значения из БД уже в нужной точности — quantize только выравнивает нули
+            exponent = decimal.Decimal(1).scaleb(-field.decimal_places)
+            return lambda value: '{:f}'.format(value.quantize(exponent))
+
+        if isinstance(field, serializers.DateTimeField):
+            output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+            if output_format is None or output_format.lower() != ISO_8601:
+                return field.to_representation
+            # Часовой пояс определяем один раз на страницу, а не на каждое значение
+            field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+
+            if field_timezone is None:
+                return field.to_representation
+
+            def format_datetime(value):
+                if timezone.is_aware(value):
+                    value = value.astimezone(field_timezone)
+                else:
+                    value = field.enforce_timezone(value)
+                text = value.isoformat()
+                return text[:-6] + 'Z' if text.endswith('+00:00') else text
+            return format_datetime
+
+        if isinstance(field, serializers.DateField):
+            output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+            if output_format is not None and output_format.lower() == ISO_8601:
+                return lambda value: value.isoformat()
+            return field.to_representation
+
+        return None
+
+    @classmethod
+    def get_values_fields(cls):
+        model = cls.model_serializer_class.Meta.model
+        return [field.name for field in model._meta.concrete_fields]
+
+    def project(self, queryset):
+        related = dict(self.owner_fields)
+        if self.include_rating:
+            related.update(self.rating_fields)
+        return queryset.values(*self.get_values_fields(), **{
+            alias: models.F(path) for alias, path in related.items()
+        })
+
+    def serialize(self, rows, with_status=True):
+        """
+        with_status=False — статус не зависит от пользователя (None),
+        такой результат можно кэшировать и потом дополнить через overlay_statuses.
+        """
+        rows = list(rows)
+        self.booking_statuses = self.resolve_statuses(rows) if with_status else {}
+
+        getters = self.get_value_getters()
+        if self.include_rating:
+            getters.append(('owner_rating', self.get_owner_rating))
+        return [{name: getter(row) for name, getter in getters} for row in rows]
+
+    def resolve_statuses(self, items):
+        user = getattr(self.request, 'user', None)
+        return self.model_serializer_class.status_resolver.resolve(
+            [(item['id'], item['user']) for item in items], user
+        )
+
+    def overlay_statuses(self, data):
+        statuses = self.resolve_statuses(data)
+        if not statuses:
+            return data
+        return [{**item, 'status': statuses.get(item['id'])} for item in data]
+
+    def get_company_name(self, row):
+        return row['owner_company'] or None
+
+    def get_contact_name(self, row):
+        if row['owner_profile_id'] is not None:
+            return row['owner_full_name'] or row['owner_username']
+        return None
+
+    def get_media_base_url(self):
+        # Для файлового хранилища URL = base_url + путь: абсолютную базу считаем один раз
+        if not hasattr(self, 'media_base_url'):
+            self.media_base_url = None
+            storage = self.photo_storage
+            if isinstance(storage, FileSystemStorage) and storage.base_url and storage.base_url.endswith('/'):
+                base = storage.base_url
+                self.media_base_url = self.request.build_absolute_uri(base) if self.request else base
+        return self.media_base_url
+
+    def get_company_logo_url(self, row):
+        name = row['owner_photo']
+        if not name:
             return None
+        return self.get_media_url(name)
 
-        # Если пользователь — ВЛАДЕЛЕЦ транспорта
-        if obj.user == user:
-            bookings = BookingRequest.objects.filter(truck=obj).exclude(status__in=["Cancelled", "Rejected"])
-            for booking in bookings:
-                if booking.status == "Finished":
-                    return "Finished"
-                elif booking.status == "Accepted":
-                    return "In Process"
+    def get_company_logo_thumbnails(self, row):
+        thumbnails = row['owner_photo_thumbnails']
+        if not row['owner_photo'] or not thumbnails:
             return None
+        return {size_name: self.get_media_url(name) for size_name, name in thumbnails.items()}
+
+    def get_media_url(self, name):
+        # У одного владельца обычно много карточек — URL строим один раз
+        if name not in self.logo_urls:
+            base = self.get_media_base_url()
+            relative = filepath_to_uri(name).lstrip('/')
+            if base is not None and '..' not in relative and ':' not in relative:
+                self.logo_urls[name] = base + relative
+            else:
+                url = self.photo_storage.url(name)
+                self.logo_urls[name] = self.request.build_absolute_uri(url) if self.request else url
+        return self.logo_urls[name]
+
+    def get_status(self, row):
+        return self.booking_statuses.get(row['id'])
+
+    def get_owner_rating(self, row):
+        # Тот же формат, что у /api/user/<id>/rating/
+        count = row['owner_rating_count'] or 0
+        return {
+            'rating': round(row['owner_rating_sum'] / count, 1) if count else 0,
+            'reviews': count,
+        }
 
-        # Если пользователь — ОТПРАВИТЕЛЬ заявки
-        booking = BookingRequest.objects.filter(truck=obj, sender=user).exclude(status="Cancelled").first()
-        if booking:
-            if booking.status == "Waiting":
-                return "Booked"
-            elif booking.status == "Accepted":
-                return "In Process"
-            elif booking.status == "Rejected":
-                return "Rejected"
-            elif booking.status == "Finished":
-                return "Finished"
 
-        return None
+class CargoRowSerializer(ListingRowSerializer):
+    model_serializer_class = CargoSerializer
 
 
+class TruckRowSerializer(ListingRowSerializer):
+    model_serializer_class = TruckSerializer
+
+    def get_contact_name(self, row):
+        return row['owner_username']
+
       
 class ProfileSerializer(serializers.ModelSerializer):
     company_photo_url = serializers.SerializerMethodField()
+    company_photo_thumbnails = serializers.SerializerMethodField()
     is_2fa_enabled = serializers.BooleanField(read_only=True)
 
     class Meta:
@@ -166,7 +438,7 @@ class ProfileSerializer(serializers.ModelSerializer):
         fields = [
             'company', 'address', 'canton', 'zip_code', 'city',
             'phone', 'mobile', 'preferred_language', 'viber_whatsapp_number',
-            'client_type', 'company_photo_url', 'full_name',
+            'client_type', 'company_photo_url', 'company_photo_thumbnails', 'full_name',
             'is_2fa_enabled',  # 👈 ДОБАВЬ СЮДА
         ]
 
@@ -176,6 +448,9 @@ class ProfileSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.company_photo.url) if request else obj.company_photo.url
         return None
 
+    def get_company_photo_thumbnails(self, obj):
+        return get_thumbnail_urls(obj, self.context.get('request'))
+
 
 
 class ExtendedUserSerializer(serializers.ModelSerializer):
@@ -223,9 +498,31 @@ from .models import CompanyDocument
 class CompanyDocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = CompanyDocument
-        fields = ['id', 'user', 'file', 'uploaded_at']
+        fields = ['id', 'user', 'file', 'original_name', 'uploaded_at']
         read_only_fields = ['id', 'uploaded_at']
 
+class BookingRequestListSerializer(serializers.ListSerializer):
+    """
+    many=True для BookingRequestSerializer: статусы вложенных cargo_data/truck_data
+    считаются для всей страницы сразу (по запросу на грузы и на машины).
+    """
+    nested_fields = ('cargo_data', 'truck_data')
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(iterable)
+
+        nested = [self.child.fields[name] for name in self.nested_fields]
+        for field in nested:
+            listings = [getattr(item, field.source) for item in items]
+            field.booking_statuses = field.resolve_booking_statuses([obj for obj in listings if obj is not None])
+        try:
+            return [self.child.to_representation(item) for item in items]
+        finally:
+            for field in nested:
+                field.booking_statuses = None
+
+
 class BookingRequestSerializer(serializers.ModelSerializer):
     sender_username = serializers.CharField(source='sender.username', read_only=True)
     sender_company = serializers.SerializerMethodField()
@@ -273,6 +570,7 @@ class BookingRequestSerializer(serializers.ModelSerializer):
             'counterpart_user_id',  # ✅ ДОБАВИЛИ
         ]
         read_only_fields = ['sender', 'receiver', 'created_at', 'updated_at']
+        list_serializer_class = BookingRequestListSerializer
 
     def get_sender_company(self, obj):
         profile = getattr(obj.sender, 'profile', None)
@@ -427,7 +725,12 @@ class TeamMemberSerializer(serializers.ModelSerializer):
         owner_profile = getattr(owner, 'profile', None)
 
         if hasattr(owner_profile, 'company_photo') and owner_profile.company_photo:
-            profile.company_photo = owner_profile.company_photo
+            # Тот же блоб и те же миниатюры, что у владельца: файл не копируется,
+            # у всей команды один URL (и один кэш браузера)
+            profile.company_photo = owner_profile.company_photo.name
+            if ContentAddressedStorage.is_blob_name(owner_profile.company_photo.name):
+                profile.company_photo_thumbnails = dict(owner_profile.company_photo_thumbnails)
+                profile.company_photo_thumbnails_source = owner_profile.company_photo_thumbnails_source
 
         if not address:
             address = owner_profile.address
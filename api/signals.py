@@ -7,7 +7,17 @@ from django.db.models.signals import pre_save
 from django.utils import timezone
 from .models import BookingRequest
 
-from .models import CargoAdmin, TruckAdmin
+from django.db import transaction
+from django.db.models.signals import post_delete, pre_delete
+from .utils import refresh_listing_availability
+
+from .models import Cargo, Truck, Review
+from .cache import bump_board_version
+from .booking_state import project_booking_to_admin
+from .inbox import invalidate_inbox_counters
+from .models import Notification, RegisteredCompany, TeamCompany, TeamMember
+from .principal import bump_principal_versions, principal_user_ids
+from .auth.user_cache import invalidate_cached_user
 
 @receiver(post_save, sender=User)
 def create_profile_for_new_user(sender, instance, created, **kwargs):
@@ -20,59 +30,102 @@ def set_booking_timestamps(sender, instance, **kwargs):
         # Новый запрос
         instance.sent_at = timezone.now()
     else:
-        # Обновление
-        try:
-            previous = BookingRequest.objects.get(pk=instance.pk)
-        except BookingRequest.DoesNotExist:
-            previous = None
+        # Обновление: прежний статус запомнен при загрузке (BookingRequest.from_db)
+        if hasattr(instance, '_loaded_status'):
+            previous_status = instance._loaded_status
+        else:
+            previous_status = BookingRequest.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
 
-        if previous:
+        if previous_status is not None:
             # accepted_at
-            if previous.status != 'Accepted' and instance.status == 'Accepted':
+            if previous_status != 'Accepted' and instance.status == 'Accepted':
                 instance.accepted_at = timezone.now()
 
             # finished_at + finished_by
-            if previous.status != 'Finished' and instance.status == 'Finished':
+            if previous_status != 'Finished' and instance.status == 'Finished':
                 instance.finished_at = timezone.now()
-                if not instance.finished_by:
-                    instance.finished_by = instance.receiver
+                if not instance.finished_by_id:
+                    instance.finished_by_id = instance.receiver_id
 
             # archived_at (если статус сменился на Finished или Cancelled)
-            if previous.status != instance.status and instance.status in ['Finished', 'Cancelled']:
+            if previous_status != instance.status and instance.status in ['Finished', 'Cancelled']:
                 instance.archived_at = timezone.now()
 
 @receiver(post_save, sender=BookingRequest)
 def update_admin_records(sender, instance, **kwargs):
-    # Для CargoAdmin
-    if instance.cargo:
-        try:
-            admin = instance.cargo.admin_copy
-            if admin:
-                admin.sender = instance.sender
-                admin.receiver = instance.receiver
-                admin.sent_at = instance.sent_at
-                admin.accepted_at = instance.accepted_at
-                admin.finished_at = instance.finished_at
-                admin.finished_by = instance.finished_by
-                admin.archived_at = instance.archived_at
-                admin.status = instance.status
-                admin.save()
-        except CargoAdmin.DoesNotExist:
-            pass
-
-    # Для TruckAdmin
-    if instance.truck:
-        try:
-            admin = instance.truck.admin_copy
-            if admin:
-                admin.sender = instance.sender
-                admin.receiver = instance.receiver
-                admin.sent_at = instance.sent_at
-                admin.accepted_at = instance.accepted_at
-                admin.finished_at = instance.finished_at
-                admin.finished_by = instance.finished_by
-                admin.archived_at = instance.archived_at
-                admin.status = instance.status
-                admin.save()
-        except TruckAdmin.DoesNotExist:
-            pass
+    instance._loaded_status = instance.status
+    # Копии в CargoAdmin/TruckAdmin — одним UPDATE, без загрузки груза и копии
+    project_booking_to_admin(instance)
+
+
+@receiver(post_save, sender=BookingRequest)
+@receiver(post_delete, sender=BookingRequest)
+def update_listing_availability(sender, instance, **kwargs):
+    refresh_listing_availability(cargo_id=instance.cargo_id, truck_id=instance.truck_id)
+
+
+# Любое изменение грузов, машин, заявок, профиля владельца (название, лого)
+# или отзывов (?include=rating) делает закэшированные витрины неактуальными
+@receiver(post_save, sender=Cargo)
+@receiver(post_delete, sender=Cargo)
+@receiver(post_save, sender=Truck)
+@receiver(post_delete, sender=Truck)
+@receiver(post_save, sender=BookingRequest)
+@receiver(post_delete, sender=BookingRequest)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_board_cache(sender, **kwargs):
+    # После коммита: иначе параллельное чтение соберёт витрину из старых данных
+    # под новой версией, и она проживёт в кэше весь BOARD_CACHE_TIMEOUT
+    transaction.on_commit(bump_board_version)
+
+
+# Счётчики бейджей (api/inbox.py) — сбрасываем у обеих сторон заявки и у получателя уведомления
+@receiver(post_save, sender=BookingRequest)
+@receiver(post_delete, sender=BookingRequest)
+def invalidate_booking_counters(sender, instance, **kwargs):
+    # После коммита — иначе параллельный запрос успеет закэшировать старые числа
+    transaction.on_commit(lambda: invalidate_inbox_counters(instance.sender_id, instance.receiver_id))
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_notification_counters(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_inbox_counters(instance.receiver_id))
+
+
+# Компания/роль пользователя (api/principal.py) кэшируется под версией пользователя.
+# До записи запоминаем, кого касалась старая версия строки (смена владельца,
+# удаление команды), после — добавляем тех, кого касается новая.
+@receiver(pre_save, sender=TeamMember)
+@receiver(pre_delete, sender=TeamMember)
+@receiver(pre_save, sender=TeamCompany)
+@receiver(pre_delete, sender=TeamCompany)
+@receiver(pre_save, sender=RegisteredCompany)
+@receiver(pre_delete, sender=RegisteredCompany)
+def collect_principal_users(sender, instance, **kwargs):
+    previous = instance
+    if 'raw' in kwargs and instance.pk:
+        # pre_save: в instance уже новые значения, старые — из БД
+        previous = sender.objects.filter(pk=instance.pk).first()
+    instance._principal_user_ids = principal_user_ids(previous) if previous and previous.pk else set()
+
+
+@receiver(post_save, sender=TeamMember)
+@receiver(post_delete, sender=TeamMember)
+@receiver(post_save, sender=TeamCompany)
+@receiver(post_delete, sender=TeamCompany)
+@receiver(post_save, sender=RegisteredCompany)
+@receiver(post_delete, sender=RegisteredCompany)
+def invalidate_principal_cache(sender, instance, **kwargs):
+    user_ids = getattr(instance, '_principal_user_ids', set()) | principal_user_ids(instance)
+    transaction.on_commit(lambda: bump_principal_versions(user_ids))
+
+
+# Пользователь кэшируется в процессах для ClaimsJWTAuthentication
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_auth_user(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
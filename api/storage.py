@@ -0,0 +1,197 @@
+import os
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+from .uploads import CONTENT_TYPE_JPEG, inspect_upload
+
+
+CAS_PREFIX = 'cas/'
+BLOB_GRACE_PERIOD = 24 * 3600  # сек.; блоб без ссылок живёт столько, прежде чем его удалят
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Медиа-хранилище с адресацией по содержимому: файл сохраняется как
+    cas/<ab>/<cd>/<sha256>.<ext>, одинаковые файлы хранятся и отдаются один раз
+    (и кэшируются браузером по одному URL). Учёт ссылок — StoredBlob,
+    физическое удаление — только сборщиком мусора (manage.py collect_stored_blobs).
+    """
+
+    def __init__(self, **kwargs):
+        # Одинаковое имя = одинаковое содержимое, перезапись безопасна
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    @staticmethod
+    def blob_name(sha256, extension):
+        return f'{CAS_PREFIX}{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+    @staticmethod
+    def is_blob_name(name):
+        return bool(name) and name.startswith(CAS_PREFIX)
+
+    def save(self, name, content, max_length=None):
+        from .models import StoredBlob
+
+        info = inspect_upload(content)
+        extension = os.path.splitext(name or '')[1].lower()
+        if info.content_type == CONTENT_TYPE_JPEG:
+            extension = '.jpg'  # .jpeg и .jpg — один и тот же блоб
+        name = self.blob_name(info.sha256, extension)
+
+        with transaction.atomic():
+            # Строку создаём без гонки (ON CONFLICT DO NOTHING): параллельная загрузка
+            # того же файла ждёт чужую вставку, а не падает с IntegrityError
+            StoredBlob.objects.bulk_create(
+                [StoredBlob(name=name, sha256=info.sha256, size=info.size, orphaned_at=timezone.now())],
+                ignore_conflicts=True,
+            )
+            # Блокировка строки не даёт сборщику удалить файл, пока мы на него ссылаемся
+            blob = StoredBlob.objects.select_for_update().get(name=name)
+            if not self.exists(name):
+                self._save_atomic(name, content)
+            if blob.ref_count <= 0:
+                # Свежая копия без ссылок получает новый льготный срок
+                StoredBlob.objects.filter(pk=blob.pk).update(orphaned_at=timezone.now())
+        return name
+
+    def _save_atomic(self, name, content):
+        # Пишем во временный файл рядом и подменяем одним rename: читатель и
+        # параллельная запись того же блоба никогда не видят файл недописанным
+        tmp_name = self._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(tmp_name), self.path(name))
+
+    def delete(self, name):
+        # Блоб могут использовать другие записи — его удалит сборщик, когда ссылок не останется
+        if self.is_blob_name(name):
+            return
+        super().delete(name)
+
+    def purge(self, name):
+        super().delete(name)
+
+
+media_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    return media_storage
+
+
+def retain_blobs(names):
+    from .models import StoredBlob
+
+    names = {name for name in names if ContentAddressedStorage.is_blob_name(name)}
+    if names:
+        StoredBlob.objects.filter(name__in=names).update(ref_count=F('ref_count') + 1, orphaned_at=None)
+
+
+def release_blobs(names):
+    from .models import StoredBlob
+
+    names = {name for name in names if ContentAddressedStorage.is_blob_name(name)}
+    if not names:
+        return
+    StoredBlob.objects.filter(name__in=names).update(ref_count=F('ref_count') - 1)
+    StoredBlob.objects.filter(name__in=names, ref_count__lte=0, orphaned_at__isnull=True).update(
+        orphaned_at=timezone.now()
+    )
+
+
+def sync_blob_references(old_names, new_names):
+    """
+    Переносит ссылки записи со старого набора файлов на новый. Вызывать в той же
+    транзакции, что и запись строки.
+    """
+    old_names, new_names = set(old_names), set(new_names)
+    retain_blobs(new_names - old_names)
+    release_blobs(old_names - new_names)
+
+
+def recount_stored_blobs():
+    """
+    Пересчитывает ref_count всех блобов по Profile и CompanyDocument
+    (на случай ручных правок в БД). Возвращает количество исправленных блобов.
+    """
+    from .models import CompanyDocument, Profile, StoredBlob
+
+    counts = Counter()
+    for photo, thumbnails in Profile.objects.values_list('company_photo', 'company_photo_thumbnails').iterator():
+        names = set((thumbnails or {}).values())
+        if photo:
+            names.add(photo)
+        counts.update(names)
+    counts.update(CompanyDocument.objects.values_list('file', flat=True).iterator())
+
+    now = timezone.now()
+    with transaction.atomic():
+        changed = []
+        for blob in StoredBlob.objects.select_for_update():
+            ref_count = counts.get(blob.name, 0)
+            orphaned_at = (blob.orphaned_at or now) if ref_count <= 0 else None
+            if (blob.ref_count, blob.orphaned_at) != (ref_count, orphaned_at):
+                blob.ref_count, blob.orphaned_at = ref_count, orphaned_at
+                changed.append(blob)
+        StoredBlob.objects.bulk_update(changed, ['ref_count', 'orphaned_at'], batch_size=500)
+    return len(changed)
+
+
+def collect_stored_blobs(grace_period=BLOB_GRACE_PERIOD, batch_size=500):
+    """
+    Удаляет файлы и строки блобов, на которые дольше grace_period никто не ссылается.
+    Возвращает количество удалённых блобов.
+    """
+    from .models import StoredBlob
+
+    deadline = timezone.now() - timedelta(seconds=grace_period)
+    removed = 0
+    while True:
+        with transaction.atomic():
+            # Заблокированные строки — их прямо сейчас сохраняют заново, пропускаем
+            batch = list(
+                StoredBlob.objects.select_for_update(skip_locked=True)
+                .filter(ref_count__lte=0, orphaned_at__lt=deadline)
+                .order_by('orphaned_at')[:batch_size]
+            )
+            for blob in batch:
+                media_storage.purge(blob.name)
+            StoredBlob.objects.filter(pk__in=[blob.pk for blob in batch]).delete()
+        removed += len(batch)
+        if len(batch) < batch_size:
+            return removed
+
+
+def collect_untracked_files(grace_period=BLOB_GRACE_PERIOD):
+    """
+    Удаляет файлы в cas/, для которых нет строки StoredBlob (остались после
+    откатившейся транзакции). Возвращает количество удалённых файлов.
+    """
+    from .models import StoredBlob
+
+    root = media_storage.path(CAS_PREFIX)
+    deadline = time.time() - grace_period
+    candidates = []
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            if os.path.getmtime(path) < deadline:
+                candidates.append(CAS_PREFIX + os.path.relpath(path, root).replace(os.sep, '/'))
+
+    removed = 0
+    for start in range(0, len(candidates), 500):
+        chunk = candidates[start:start + 500]
+        tracked = set(StoredBlob.objects.filter(name__in=chunk).values_list('name', flat=True))
+        for name in chunk:
+            if name not in tracked:
+                media_storage.purge(name)
+                removed += 1
+    return removed
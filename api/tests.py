@@ -1,3 +1,197 @@
-from django.test import TestCase
+import datetime
+import io
+import shutil
+import tempfile
+from collections import OrderedDict
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.auth import user_cache
+from api.booking_state import BookingConflict, transition_booking
+from api.models import BookingRequest, Cargo, Profile, RegisteredCompany, StoredBlob, TeamCompany
+from api.storage import media_storage, recount_stored_blobs
+from api.thumbnails import generate_thumbnails
+
+
+def make_png(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (300, 200), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_user(username):
+    user = User.objects.create_user(username, f'{username}@example.com', 'password')
+    Profile.objects.get_or_create(user=user)
+    return user
+
+
+def make_cargo(user):
+    # Номер груза строится из кода компании владельца
+    RegisteredCompany.objects.get_or_create(registered_by=user, defaults={'country': 'ukraine', 'code': '12345678'})
+    return Cargo.objects.create(
+        user=user, loading_city_primary='Kyiv', unloading_city_primary='Lviv',
+        date_from=datetime.date(2025, 1, 1), cargo_type='pallets', show_on_main=True,
+    )
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(User.objects.get(pk=user.pk))
+    return client
+
+
+class MediaRootMixin:
+    # Блобы пишутся во временный MEDIA_ROOT, а не в media/ проекта
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._media_root = tempfile.mkdtemp()
+        cls._media_override = override_settings(MEDIA_ROOT=cls._media_root)
+        cls._media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._media_override.disable()
+        shutil.rmtree(cls._media_root, ignore_errors=True)
+        super().tearDownClass()
+
+
+class StoredBlobReferenceTests(MediaRootMixin, TestCase):
+    """ref_count блобов фото компании при загрузке, замене, удалении и копировании в команду."""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = make_user('owner')
+
+    def upload_photo(self, user, content, name='logo.png'):
+        response = client_for(user).post('/api/company/photo/', {'company_photo': SimpleUploadedFile(name, content)})
+        self.assertEqual(response.status_code, 201, response.content)
+        return Profile.objects.get(user=user).company_photo.name
+
+    def ref_count(self, name):
+        return StoredBlob.objects.get(name=name).ref_count
+
+    def test_create_replace_delete(self):
+        first = self.upload_photo(self.owner, make_png((1, 2, 3)))
+        self.assertTrue(first.startswith('cas/'))
+        self.assertEqual(self.ref_count(first), 1)
+
+        second = self.upload_photo(self.owner, make_png((4, 5, 6)))
+        self.assertEqual((self.ref_count(first), self.ref_count(second)), (0, 1))
+        self.assertTrue(media_storage.exists(first))  # файл удаляет только сборщик
+
+        response = client_for(self.owner).delete('/api/company/photo/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.ref_count(second), 0)
+        self.assertEqual(recount_stored_blobs(), 0)
+
+    def test_same_content_is_one_blob(self):
+        other = make_user('other')
+        content = make_png((7, 8, 9))
+        name = self.upload_photo(self.owner, content, 'a.png')
+        self.assertEqual(self.upload_photo(other, content, 'b.png'), name)
+        self.assertEqual(StoredBlob.objects.count(), 1)
+        self.assertEqual(self.ref_count(name), 2)
+
+    def test_team_member_copies_owner_photo(self):
+        name = self.upload_photo(self.owner, make_png((1, 2, 3)))
+        generate_thumbnails()
+        thumbnails = Profile.objects.get(user=self.owner).company_photo_thumbnails
+        self.assertTrue(thumbnails)
+
+        TeamCompany.objects.create(name='Team', created_by=self.owner)
+        response = client_for(self.owner).post('/api/team/add-member/', {
+            'username': 'worker', 'password': 'password', 'email': 'worker@example.com', 'role': 'worker',
+            'phone': '+380000000000', 'full_name': 'Worker',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        member = Profile.objects.get(user__username='worker')
+        self.assertEqual(member.company_photo.name, name)
+        self.assertEqual(member.company_photo_thumbnails, thumbnails)
+        for blob_name in [name, *thumbnails.values()]:
+            self.assertEqual(self.ref_count(blob_name), 2)
+        self.assertEqual(recount_stored_blobs(), 0)
+
+    def test_identical_reupload_gets_thumbnails_again(self):
+        content = make_png((1, 2, 3))
+        name = self.upload_photo(self.owner, content)
+        generate_thumbnails()
+        self.assertTrue(Profile.objects.get(user=self.owner).company_photo_thumbnails)
+
+        # Замена, и до воркера — снова тот же файл (то же имя блоба)
+        self.upload_photo(self.owner, make_png((4, 5, 6)))
+        self.assertEqual(self.upload_photo(self.owner, content), name)
+        profile = Profile.objects.get(user=self.owner)
+        self.assertEqual((profile.company_photo_thumbnails, profile.company_photo_thumbnails_source), ({}, ''))
+
+        generate_thumbnails()
+        profile = Profile.objects.get(user=self.owner)
+        self.assertTrue(profile.company_photo_thumbnails)
+        self.assertEqual(profile.company_photo_thumbnails_source, name)
+
+
+class BookingTransitionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.receiver = make_user('receiver')
+        self.sender = make_user('sender')
+        cargo = make_cargo(self.receiver)
+        self.booking = BookingRequest.objects.create(sender=self.sender, receiver=self.receiver, cargo=cargo)
+        self.url = f'/api/booking-requests/{self.booking.pk}/'
+
+    def test_disallowed_transition_is_400(self):
+        client = client_for(self.receiver)
+        self.assertEqual(client.patch(self.url, {'status': 'Accepted'}, format='json').status_code, 200)
+        response = client.patch(self.url, {'status': 'Accepted'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', response.data)
+
+    def test_concurrent_change_is_409(self):
+        stale = BookingRequest.objects.get(pk=self.booking.pk)
+        # Второй писатель успел принять заявку
+        self.assertEqual(client_for(self.receiver).patch(self.url, {'status': 'Accepted'}, format='json').status_code, 200)
+        with self.assertRaises(BookingConflict) as raised:
+            transition_booking(stale, 'Rejected')
+        self.assertEqual(raised.exception.status_code, 409)
+        self.assertEqual(BookingRequest.objects.get(pk=self.booking.pk).status, 'Accepted')
+
+
+class CacheInvalidationTests(TestCase):
+    """Изменения, сделанные другим процессом, видны через версии в общем кэше."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('reader')
+
+    def board_ids(self, client):
+        data = client.get('/api/main-cargo/').json()
+        rows = data['results'] if isinstance(data, dict) else data
+        return {row['id'] for row in rows}
+
+    def test_board_sees_other_writer(self):
+        client = client_for(self.user)
+        self.assertEqual(self.board_ids(client), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            cargo = make_cargo(self.user)
+        self.assertEqual(self.board_ids(client), {cargo.pk})
+
+    def test_cached_user_dropped_after_other_process_saves(self):
+        self.assertEqual(user_cache.get_cached_user(self.user.pk).first_name, '')
+        self.assertIn(self.user.pk, user_cache._entries)
+
+        # У другого процесса свой кэш в памяти: наш он не трогает, только версию в общем кэше
+        with mock.patch.object(user_cache, '_entries', OrderedDict()):
+            with self.captureOnCommitCallbacks(execute=True):
+                writer_copy = User.objects.get(pk=self.user.pk)
+                writer_copy.first_name = 'Changed'
+                writer_copy.save()
+
+        self.assertIn(self.user.pk, user_cache._entries)
+        self.assertEqual(user_cache.get_cached_user(self.user.pk).first_name, 'Changed')
@@ -0,0 +1,238 @@
+import atexit
+import hashlib
+import logging
+import threading
+
+from django.db import connections, transaction
+from django.utils import timezone
+from rest_framework.throttling import SimpleRateThrottle
+
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Ограничение частоты по скользящему окну: счётчики текущего и прошлого окна
+    лежат в кэше Django (Redis на проде — общий для всех процессов, LocMem
+    локально), прошлое окно учитывается с весом оставшейся доли. В отличие от
+    SimpleRateThrottle, в кэше хранится два числа на ключ, а не список
+    меток времени.
+    Частоты — в REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] по scope.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        window = int(now // self.duration)
+        self.elapsed = now / self.duration - window   # доля текущего окна, что уже прошла
+        current_key = f'{self.key}:{window}'
+        previous_key = f'{self.key}:{window - 1}'
+
+        counts = self.cache.get_many([current_key, previous_key])
+        self.current = counts.get(current_key, 0)
+        self.previous = counts.get(previous_key, 0)
+        if self.previous * (1 - self.elapsed) + self.current >= self.num_requests:
+            return False
+
+        # add + incr атомарны и в Redis, и в LocMem; счётчик живёт два окна
+        self.cache.add(current_key, 0, self.duration * 2)
+        try:
+            self.cache.incr(current_key)
+        except ValueError:
+            # Ключ истёк между add и incr
+            self.cache.set(current_key, 1, self.duration * 2)
+        return True
+
+    def wait(self):
+        # Сколько ждать, пока оценка опустится ниже лимита
+        if self.current >= self.num_requests or not self.previous:
+            remaining = 1 - self.elapsed
+        else:
+            remaining = 1 - (self.num_requests - self.current) / self.previous - self.elapsed
+        return max(remaining, 0) * self.duration
+
+
+class IPThrottle(SlidingWindowThrottle):
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class AccountThrottle(SlidingWindowThrottle):
+    """
+    Лимит на учётную запись из тела запроса (по умолчанию — email): перебор
+    одного аккаунта с разных IP упирается в него. Без поля — не ограничивает.
+    """
+    account_field = 'email'
+
+    def get_cache_key(self, request, view):
+        account = request.data.get(self.account_field)
+        if not isinstance(account, str) or not account.strip():
+            return None
+        # В ключе — хэш, а не сам email
+        ident = hashlib.sha256(account.strip().lower().encode()).hexdigest()[:32]
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login-ip'
+
+
+class LoginAccountThrottle(AccountThrottle):
+    scope = 'login-account'
+
+
+class TwoFactorIPThrottle(IPThrottle):
+    scope = '2fa-ip'
+
+
+class TwoFactorAccountThrottle(AccountThrottle):
+    scope = '2fa-account'
+
+
+class VerifyEmailIPThrottle(IPThrottle):
+    scope = 'verify-email-ip'
+
+
+class VerifyEmailAccountThrottle(AccountThrottle):
+    scope = 'verify-email-account'
+
+
+class CompanyCodeIPThrottle(IPThrottle):
+    scope = 'company-code-ip'
+
+
+SUSPICIOUS_FLUSH_SIZE = 100      # попыток в буфере, после которых пишем в БД
+SUSPICIOUS_FLUSH_INTERVAL = 30   # сек.; дольше попытка в памяти не лежит
+SUSPICIOUS_MAX_KEYS = 1000       # разных (страна, код, IP) в буфере процесса
+
+
+class SuspiciousAttemptBuffer:
+    """
+    Копит подозрительные попытки в памяти процесса, схлопывая повторы
+    (страна, код, IP) в одну строку со счётчиком attempts, и пишет их в БД
+    одним bulk_create: сразу, если набралось flush_size попыток или max_keys
+    ключей, иначе — по таймеру через flush_interval после первой попытки
+    (независимо от нового трафика), и при остановке процесса. Так что при
+    падении или SIGKILL теряется не больше flush_interval секунд попыток.
+    """
+
+    def __init__(self, flush_size=SUSPICIOUS_FLUSH_SIZE, flush_interval=SUSPICIOUS_FLUSH_INTERVAL,
+                 max_keys=SUSPICIOUS_MAX_KEYS):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._pending = {}   # (country, code, ip) -> [attempts, первая попытка]
+        self._count = 0
+        self._timer = None
+
+    def record(self, country, code, ip_address):
+        key = (country or '', code or '', ip_address or None)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = [1, timezone.now()]
+            else:
+                entry[0] += 1
+            self._count += 1
+            due = self._count >= self.flush_size or len(self._pending) >= self.max_keys
+            if not due:
+                self._start_timer()
+        if due:
+            # Пишем после коммита запроса, чтобы не держать его транзакцию; ошибка
+            # записи не должна превращать уже выполненный запрос в 500
+            transaction.on_commit(self.flush_safely)
+
+    def _start_timer(self):
+        # Вызывать под self._lock
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def take(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._count = 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return pending
+
+    def restore(self, pending):
+        """
+        Возвращает в буфер то, что не удалось записать, складывая с попытками,
+        пришедшими за это время. Следующая запись — снова по таймеру. Пока БД
+        недоступна, буфер не растёт больше max_keys ключей: лишние отбрасываются.
+        """
+        dropped = 0
+        with self._lock:
+            for key, (attempts, first_at) in pending.items():
+                entry = self._pending.get(key)
+                if entry is None:
+                    if len(self._pending) >= self.max_keys:
+                        dropped += attempts
+                        continue
+                    self._pending[key] = [attempts, first_at]
+                else:
+                    entry[0] += attempts
+                    entry[1] = min(entry[1], first_at)
+                self._count += attempts
+            if self._pending:
+                self._start_timer()
+        if dropped:
+            logger.warning('Буфер подозрительных попыток переполнен, отброшено попыток: %s', dropped)
+
+    def flush_safely(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Не удалось записать подозрительные попытки')
+
+    def flush_from_timer(self):
+        try:
+            self.flush_safely()
+        finally:
+            # Соединение с БД этого потока Django сам не закроет
+            connections.close_all()
+
+    def flush(self):
+        """
+        Записывает накопленное. Возвращает количество созданных строк.
+        Если запись не удалась, попытки возвращаются в буфер, а ошибка пробрасывается.
+        """
+        from .models import SuspiciousAttempt
+
+        pending = self.take()
+        if not pending:
+            return 0
+        try:
+            # Одна транзакция: при ошибке не остаётся записанной половины, которую restore удвоил бы
+            with transaction.atomic():
+                SuspiciousAttempt.objects.bulk_create([
+                    SuspiciousAttempt(country=country, code=code, ip_address=ip_address,
+                                      attempts=attempts, attempted_at=first_at)
+                    for (country, code, ip_address), (attempts, first_at) in pending.items()
+                ], batch_size=500)
+        except Exception:
+            self.restore(pending)
+            raise
+        return len(pending)
+
+
+suspicious_attempts = SuspiciousAttemptBuffer()
+
+
+@atexit.register
+def flush_suspicious_attempts_on_exit():
+    # Остаток буфера при остановке процесса (рестарт dyno, деплой)
+    try:
+        suspicious_attempts.flush()
+    except Exception:
+        logger.exception('Не удалось записать подозрительные попытки при остановке')
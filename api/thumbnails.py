@@ -0,0 +1,163 @@
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q
+
+from .cache import bump_board_version
+from .models import Profile
+from .storage import sync_blob_references
+
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_BATCH_SIZE = 20
+
+# Размер (вписывается в рамку с сохранением пропорций) для каждого места вывода
+THUMBNAIL_SIZES = {
+    'avatar': (64, 64),
+    'card': (160, 160),
+    'full': (512, 512),
+}
+THUMBNAIL_QUALITY = 82
+RASTER_EXTENSIONS = ('jpg', 'jpeg', 'png', 'webp')
+
+
+def thumbnail_format():
+    # WebP, если Pillow собран с ним; иначе JPEG
+    from PIL import features
+
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def render_thumbnails(source):
+    """
+    Декодирует картинку один раз и возвращает {размер: байты миниатюры}.
+    Для JPEG декодирование сразу идёт в уменьшенном масштабе (Image.draft).
+    """
+    from PIL import Image, ImageOps
+
+    image_format, _ = thumbnail_format()
+    if image_format == 'WEBP':
+        save_options = {'quality': THUMBNAIL_QUALITY, 'method': 4}
+    else:
+        save_options = {'quality': THUMBNAIL_QUALITY, 'optimize': True, 'progressive': True}
+    largest = max(THUMBNAIL_SIZES.values())
+
+    with Image.open(source) as image:
+        image.draft('RGB', largest)
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha and image_format == 'WEBP' else 'RGB')
+
+        rendered = {}
+        # От большего к меньшему: каждая следующая миниатюра считается из предыдущей
+        for size_name, size in sorted(THUMBNAIL_SIZES.items(), key=lambda item: item[1], reverse=True):
+            image.thumbnail(size, Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, image_format, **save_options)
+            rendered[size_name] = buffer.getvalue()
+    return rendered
+
+
+def thumbnail_name(source_name, size_name, extension):
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    return f'company_photos/thumbs/{stem}_{size_name}.{extension}'
+
+
+def pending_thumbnails_queryset():
+    # Фото есть, но миниатюры построены не для него (или ещё ни разу)
+    return (
+        Profile.objects.exclude(Q(company_photo='') | Q(company_photo__isnull=True))
+        .exclude(company_photo_thumbnails_source=F('company_photo'))
+    )
+
+
+def build_profile_thumbnails(profile):
+    """
+    Строит миниатюры для текущего company_photo профиля и сохраняет их условным
+    UPDATE ... WHERE company_photo = <исходное имя>: если фото успели заменить,
+    результат выбрасывается. Возвращает True, если миниатюры записаны.
+    """
+    source_name = profile.company_photo.name
+    storage = profile.company_photo.storage
+    extension = os.path.splitext(source_name)[1][1:].lower()
+
+    thumbnails = {}
+    if extension in RASTER_EXTENSIONS:
+        with storage.open(source_name, 'rb') as source:
+            rendered = render_thumbnails(source)
+        _, thumb_extension = thumbnail_format()
+        for size_name, content in rendered.items():
+            thumbnails[size_name] = storage.save(
+                thumbnail_name(source_name, size_name, thumb_extension), ContentFile(content)
+            )
+    # SVG/PDF не уменьшаем: источник отмечается обработанным, клиенты берут оригинал
+
+    if not store_thumbnails(profile, source_name, thumbnails):
+        delete_thumbnail_files(storage, thumbnails)
+        return False
+
+    delete_thumbnail_files(storage, profile.company_photo_thumbnails)
+    return True
+
+
+def store_thumbnails(profile, source_name, thumbnails):
+    # UPDATE не шлёт сигналов и не вызывает Profile.save — ссылки на блобы переносим сами
+    with transaction.atomic():
+        updated = Profile.objects.filter(pk=profile.pk, company_photo=source_name).update(
+            company_photo_thumbnails=thumbnails,
+            company_photo_thumbnails_source=source_name,
+        )
+        if updated:
+            sync_blob_references(profile.company_photo_thumbnails.values(), thumbnails.values())
+    return bool(updated)
+
+
+def delete_thumbnail_files(storage, thumbnails):
+    for name in (thumbnails or {}).values():
+        try:
+            storage.delete(name)
+        except Exception:
+            logger.warning("thumbnail %s could not be deleted", name, exc_info=True)
+
+
+def generate_thumbnails(batch_size=THUMBNAIL_BATCH_SIZE):
+    """
+    Обрабатывает одну пачку профилей с новыми фото.
+    Возвращает количество обработанных профилей.
+    """
+    batch = list(pending_thumbnails_queryset().order_by('pk')[:batch_size])
+
+    built = 0
+    for profile in batch:
+        try:
+            if build_profile_thumbnails(profile):
+                built += 1
+        except Exception as exc:
+            # Битый файл не должен блокировать очередь: помечаем как обработанный без миниатюр
+            logger.warning("thumbnails for profile %s failed: %r", profile.pk, exc)
+            store_thumbnails(profile, profile.company_photo.name, {})
+
+    if built:
+        # В кэше витрин лежат карточки без миниатюр
+        bump_board_version()
+    if batch:
+        logger.info("thumbnails built=%d processed=%d", built, len(batch))
+    return len(batch)
+
+
+def get_thumbnail_urls(profile, request=None):
+    """
+    {avatar, card, full} -> URL миниатюр фото компании или None, пока их нет.
+    """
+    if not profile or not profile.company_photo or not profile.company_photo_thumbnails:
+        return None
+    storage = profile.company_photo.storage
+    urls = {}
+    for size_name, name in profile.company_photo_thumbnails.items():
+        url = storage.url(name)
+        urls[size_name] = request.build_absolute_uri(url) if request else url
+    return urls
@@ -1,5 +1,7 @@
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from django.contrib.auth.models import update_last_login
 from django.contrib.auth.models import User
 from rest_framework import serializers
 from django.contrib.auth import authenticate
@@ -10,10 +12,13 @@ from rest_framework import status
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 import pyotp
-from rest_framework_simplejwt.tokens import RefreshToken
+from .auth.claims import PrincipalRefreshToken
+from .throttling import LoginAccountThrottle, LoginIPThrottle, TwoFactorAccountThrottle, TwoFactorIPThrottle
 
 
 class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = PrincipalRefreshToken  # access-токен с claims для ClaimsJWTAuthentication
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['email'] = serializers.EmailField(write_only=True)
@@ -24,17 +29,14 @@ class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
         email = attrs.get("email")
         password = attrs.get("password")
 
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            raise serializers.ValidationError("Пользователь с таким email не найден.")
-
-        user = authenticate(username=user.username, password=password)
+        # Одна выборка пользователя и один хэш пароля (EmailBackend)
+        user = authenticate(self.context.get("request"), email=email, password=password)
 
         if not user:
+            # Неудачный вход — только здесь выясняем причину для сообщения
+            if not User.objects.filter(email=email).exists():
+                raise serializers.ValidationError("Пользователь с таким email не найден.")
             raise serializers.ValidationError("Неверный email или пароль.")
-        if not user.is_active:
-            raise serializers.ValidationError("Пользователь не активирован.")
 
         # ✅ Проверяем 2FA
         if hasattr(user, "profile") and user.profile.is_2fa_enabled:
@@ -42,7 +44,13 @@ class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
             raise serializers.ValidationError({"2fa_required": True})
 
         self.user = user
-        return super().validate({"username": user.username, "password": password})
+
+        # То же, что TokenObtainPairSerializer.validate, но без повторного authenticate
+        refresh = self.get_token(user)
+        data = {"refresh": str(refresh), "access": str(refresh.access_token)}
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+        return data
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -57,9 +65,12 @@ class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
 
 class EmailTokenObtainPairView(TokenObtainPairView):
     serializer_class = EmailTokenObtainPairSerializer
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle]
 
 
 class Verify2FALoginView(APIView):
+    throttle_classes = [TwoFactorIPThrottle, TwoFactorAccountThrottle]
+
     def post(self, request):
         email = request.data.get("email")
         code = request.data.get("code")
@@ -81,7 +92,7 @@ class Verify2FALoginView(APIView):
             return Response({"error": "Неверный код"}, status=status.HTTP_400_BAD_REQUEST)
 
         # Всё ок — выдаём токен
-        refresh = RefreshToken.for_user(user)
+        refresh = PrincipalRefreshToken.for_user(user)
         return Response({
             "access": str(refresh.access_token),
             "refresh": str(refresh),
@@ -0,0 +1,66 @@
+import hashlib
+import io
+
+import pyotp
+from django.core import signing
+from django.core.cache import cache
+
+
+TWOFA_ISSUER = "Platforma"
+QR_CACHE_TIMEOUT = 600   # сек.; секрет не меняется, пока 2FA настраивается
+QR_URL_MAX_AGE = 600     # сколько живёт подписанная ссылка на картинку
+QR_SIGNING_SALT = 'api.twofa.qr'
+
+
+def get_or_create_secret(profile):
+    """
+    Секрет 2FA профиля; новый создаётся только если его ещё нет, чтобы повторный
+    запрос QR не ломал уже отсканированный код.
+    """
+    if not profile.two_factor_secret:
+        profile.two_factor_secret = pyotp.random_base32()
+        profile.save(update_fields=['two_factor_secret'])
+    return profile.two_factor_secret
+
+
+def secret_fingerprint(secret):
+    # В ключах кэша, ETag и ссылках — только хэш секрета
+    return hashlib.sha256(secret.encode()).hexdigest()[:16]
+
+
+def render_qr_png(data):
+    # qrcode (и PIL через него) грузим только при первом рендере, а не при старте воркера
+    import qrcode
+
+    buffer = io.BytesIO()
+    qrcode.make(data).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def get_qr_png(user, secret):
+    """
+    PNG с otpauth-QR для (user, secret), из кэша или отрисованный один раз.
+    """
+    key = f'2fa:qr:{user.pk}:{secret_fingerprint(secret)}'
+    png = cache.get(key)
+    if png is None:
+        otp_uri = pyotp.totp.TOTP(secret).provisioning_uri(name=user.email, issuer_name=TWOFA_ISSUER)
+        png = render_qr_png(otp_uri)
+        cache.set(key, png, QR_CACHE_TIMEOUT)
+    return png
+
+
+def make_qr_token(user, secret):
+    # Ссылка на картинку привязана к пользователю и секрету: после смены секрета она не работает
+    return signing.dumps({'u': user.pk, 's': secret_fingerprint(secret)}, salt=QR_SIGNING_SALT, compress=True)
+
+
+def read_qr_token(token):
+    """
+    (user_id, fingerprint) из подписанной ссылки или None, если подпись неверна/устарела.
+    """
+    try:
+        payload = signing.loads(token, salt=QR_SIGNING_SALT, max_age=QR_URL_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    return payload.get('u'), payload.get('s')
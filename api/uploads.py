@@ -0,0 +1,133 @@
+import hashlib
+import io
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+# Сколько первых байт файла держим в памяти для определения типа и размеров
+UPLOAD_HEAD_BYTES = 256 * 1024
+
+CONTENT_TYPE_JPEG = 'image/jpeg'
+CONTENT_TYPE_PNG = 'image/png'
+CONTENT_TYPE_WEBP = 'image/webp'
+CONTENT_TYPE_PDF = 'application/pdf'
+CONTENT_TYPE_SVG = 'image/svg+xml'
+
+RASTER_CONTENT_TYPES = (CONTENT_TYPE_JPEG, CONTENT_TYPE_PNG, CONTENT_TYPE_WEBP)
+DOCUMENT_CONTENT_TYPES = RASTER_CONTENT_TYPES + (CONTENT_TYPE_PDF,)
+DOCUMENT_MAX_SIZE = 20 * 1024 * 1024
+PHOTO_MAX_SIZE = 2 * 1024 * 1024  # фото компании, см. validate_company_file
+
+
+class UploadInfo:
+    """
+    Что известно о загруженном файле без его декодирования: тип по сигнатуре,
+    размер, sha256 и (для картинок) ширина/высота из заголовка.
+    """
+
+    def __init__(self, content_type=None, size=0, sha256='', image_size=None, truncated=False):
+        self.content_type = content_type
+        self.size = size
+        self.sha256 = sha256
+        self.image_size = image_size  # (width, height) или None
+        self.truncated = truncated    # файл длиннее лимита, дальше лимита не записан
+
+    @classmethod
+    def from_head(cls, head, size, sha256, truncated=False):
+        content_type = sniff_content_type(head)
+        image_size = read_image_size(head) if content_type in RASTER_CONTENT_TYPES else None
+        return cls(content_type, size, sha256, image_size, truncated)
+
+
+def sniff_content_type(head):
+    if head.startswith(b'\xff\xd8\xff'):
+        return CONTENT_TYPE_JPEG
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return CONTENT_TYPE_PNG
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return CONTENT_TYPE_WEBP
+    if head.startswith(b'%PDF-'):
+        return CONTENT_TYPE_PDF
+    text = head[:1024].lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    if text.startswith(b'<svg') or (text.startswith(b'<?xml') and b'<svg' in text):
+        return CONTENT_TYPE_SVG
+    return None
+
+
+def read_image_size(head):
+    # Image.open читает только заголовок; пиксели не декодируются.
+    # PIL импортируем здесь, чтобы он не грузился при старте каждого воркера
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(head)) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+def inspect_upload(file):
+    """
+    UploadInfo для файла. Если файл пришёл через StreamingUploadHandler, всё уже
+    посчитано при приёме; иначе файл читается один раз кусками (без декодирования).
+    """
+    info = getattr(file, 'upload_info', None)
+    if info is not None:
+        return info
+
+    digest = hashlib.sha256()
+    head = bytearray()
+    size = 0
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+        if len(head) < UPLOAD_HEAD_BYTES:
+            head += chunk[:UPLOAD_HEAD_BYTES - len(head)]
+        size += len(chunk)
+    file.seek(0)
+
+    file.upload_info = UploadInfo.from_head(bytes(head), size, digest.hexdigest())
+    return file.upload_info
+
+
+class StreamingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет файлы multipart-запроса прямо во временные файлы на диске (без
+    буферизации в памяти), по ходу считает sha256 и запоминает только начало
+    файла для проверки сигнатуры и размеров. Всё, что сверх max_size, не пишется.
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+        self.head = bytearray()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.max_size is not None and self.received > self.max_size:
+            return None  # остаток тела дочитывается, но никуда не пишется
+
+        self.digest.update(raw_data)
+        if len(self.head) < UPLOAD_HEAD_BYTES:
+            self.head += raw_data[:UPLOAD_HEAD_BYTES - len(self.head)]
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        truncated = self.max_size is not None and self.received > self.max_size
+        file.upload_info = UploadInfo.from_head(bytes(self.head), self.received, self.digest.hexdigest(), truncated)
+        return file
+
+
+def use_streaming_uploads(request, max_size=None):
+    """
+    Включает StreamingUploadHandler для запроса. Вызывать до первого обращения
+    к request.data / request.FILES.
+    """
+    django_request = getattr(request, '_request', request)
+    django_request.upload_handlers = [StreamingUploadHandler(django_request, max_size=max_size)]
@@ -1,54 +1,79 @@
 def get_user_company_and_role(user):
-    from .models import TeamMember, TeamCompany  # можно оставить, это безопасно
-
-    # 1. Если пользователь владелец
-    team_company = TeamCompany.objects.filter(created_by=user).first()
-    if team_company:
-        return team_company, 'owner'
-    
-    # 2. Если сотрудник или менеджер
-    team_member = TeamMember.objects.filter(user=user).first()
-    if team_member:
-        return team_member.company, team_member.role  # 'manager' или 'worker'
+    # Импорт внутри функции — чтобы избежать циклической ошибки
+    from .principal import get_principal
 
-    # 3. Если ничего не нашли
-    return None, None
+    principal = get_principal(user)
+    return principal.company, principal.role  # role: 'owner', 'manager', 'worker' или None
 
 
 def get_company_code(user):
-    # Импорт внутри функции — чтобы избежать циклической ошибки
-    from .models import RegisteredCompany, TeamMember
+    from .principal import get_principal
+
+    return get_principal(user).company_code
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+
+def backoff_delay(attempts, base, maximum):
+    """
+    Экспоненциальная задержка перед повторной попыткой: base, 2*base, 4*base... но не больше maximum (сек.).
+    """
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), maximum))
 
-    # 1. Владелец компании
-    registered = RegisteredCompany.objects.filter(registered_by=user).first()
-    if registered:
-        return ''.join(filter(str.isdigit, registered.code))  # только цифры
 
-    # 2. Участник команды
-    team_member = TeamMember.objects.select_related('company__registered_company').filter(user=user).first()
-    if team_member and team_member.company.registered_company:
-        return ''.join(filter(str.isdigit, team_member.company.registered_company.code))
+def refresh_listing_availability(cargo_id=None, truck_id=None):
+    """
+    Пересчитывает Cargo.availability / Truck.availability по статусам заявок.
+    """
+    from .models import BookingRequest, Cargo, Truck, availability_for_statuses
+
+    targets = [(Cargo, 'cargo_id', cargo_id), (Truck, 'truck_id', truck_id)]
 
-    return None
+    with transaction.atomic():
+        for model, booking_field, pk in targets:
+            if pk is None:
+                continue
 
-from django.db.models import Avg, Count
+            # Блокируем строку, чтобы параллельные смены статуса не затёрли друг друга
+            if not model.objects.select_for_update().filter(pk=pk).exists():
+                continue
+
+            statuses = BookingRequest.objects.filter(**{booking_field: pk}).values_list('status', flat=True).distinct()
+            model.objects.filter(pk=pk).update(availability=availability_for_statuses(statuses))
 
 
 def get_user_rating_data(user):
+    """
+    Возвращает среднюю оценку и количество отзывов для target_user (из UserRatingSummary).
+    """
+    from .models import UserRatingSummary
+
+    summary = UserRatingSummary.objects.filter(user=user).first()
+    if not summary:
+        return 0, 0
+    return summary.average, summary.rating_count
+
 
-    from .models import Review
+def rebuild_rating_summaries():
     """
-    Возвращает среднюю оценку и количество отзывов для target_user.
+    Пересчитывает UserRatingSummary целиком по таблице Review (на случай расхождений).
     """
-    data = Review.objects.filter(target_user=user).aggregate(
-        average_rating=Avg('rating'),
-        total_reviews=Count('id')
-    )
-    
-    # Округляем до 1 знака после запятой, если есть отзывы
-    average = round(data['average_rating'], 1) if data['average_rating'] else 0
-    count = data['total_reviews']
-    
-    return average, count
+    from .models import Review, UserRatingSummary
 
+    stars = {
+        field: Count('id', filter=Q(rating=star))
+        for star, field in UserRatingSummary.STAR_FIELDS.items()
+    }
+    rows = Review.objects.values('target_user_id').annotate(
+        rating_sum=Sum('rating'), rating_count=Count('id'), **stars
+    )
 
+    with transaction.atomic():
+        UserRatingSummary.objects.all().delete()
+        summaries = UserRatingSummary.objects.bulk_create([
+            UserRatingSummary(user_id=row.pop('target_user_id'), **row) for row in rows
+        ], batch_size=1000)
+    return len(summaries)
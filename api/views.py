@@ -1,18 +1,19 @@
 import json
 from django.shortcuts import render, redirect
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
 from django.conf import settings
 from rest_framework import generics, viewsets, status
 from .serializers import ExtendedUserSerializer, UserSerializer, TeamMemberDetailSerializer
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from .models import Cargo, EmailVerification, Truck, BookingRequest, TeamCompany, TeamMember
+from .models import MAIN_PAGE_AVAILABILITY, AVAILABLE_BOARD_AVAILABILITY, SEARCH_AVAILABILITY
 from .serializers import CargoSerializer, UserSerializer, TruckSerializer, ProfileSerializer, BookingRequestSerializer, TeamCompanySerializer, TeamMemberSerializer
+from .serializers import CargoRowSerializer, TruckRowSerializer
 from .forms import CargoForm
 import random
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from .auth.claims import PrincipalRefreshToken
 from rest_framework.decorators import permission_classes
 import requests
 from django.utils.translation import gettext as _
@@ -21,35 +22,49 @@ import logging
 from rest_framework import generics
 from rest_framework.exceptions import PermissionDenied
 
-from django.db import models
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models, transaction
 
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-
-from .models import Notification
+from .models import Notification, validate_company_file
 
 from .serializers import NotificationSerializer
 
 from rest_framework.generics import ListAPIView
 
 from .utils import get_user_company_and_role
+from .principal import get_principal
+from .pagination import KeysetPagination
+from .bulk import CargoBulkImport, TruckBulkImport, CSVParser, get_bulk_rows
+from .notifications import send_notification_to_user
+from .emails import queue_email
+from .thumbnails import get_thumbnail_urls
+from .resumable import UploadOffsetConflict, UploadSession
+from .storage import retain_blobs
+from .uploads import DOCUMENT_CONTENT_TYPES, DOCUMENT_MAX_SIZE, PHOTO_MAX_SIZE, inspect_upload, use_streaming_uploads
+from .booking_state import transition_booking
+from .inbox import INBOX_BOXES, get_inbox_counters, get_inbox_user_id, inbox_queryset
+from .cache import board_cache_key, board_etag, get_or_build, make_etag, not_modified_response
+from .throttling import (
+    CompanyCodeIPThrottle, TwoFactorAccountThrottle, TwoFactorIPThrottle, VerifyEmailAccountThrottle,
+    VerifyEmailIPThrottle, suspicious_attempts,
+)
+from .twofa import get_or_create_secret, get_qr_png, make_qr_token, read_qr_token, secret_fingerprint
 
 from api.models import Profile, TeamMember, RegisteredCompany
 
 import pyotp
-import qrcode
-import io
 import base64
 
 from rest_framework import viewsets, permissions
 
 from .serializers import ReviewSerializer
 
-from .models import Review
+from .models import Review, UserRatingSummary
 
 import os
 from django.views.generic import View
-from django.http import FileResponse
+from django.http import FileResponse, HttpResponse
+from django.urls import reverse
 
 class FrontendAppView(View):
     def get(self, request):
@@ -81,13 +96,13 @@ class CreateUserView(generics.CreateAPIView):
         from_email = settings.DEFAULT_FROM_EMAIL
         recipient_list = [user.email]
 
-        try:
-            send_mail(subject, message, from_email, recipient_list, fail_silently=False)
-            print("[DEBUG] Email was sent successfully.")
-        except Exception as e:
-            print(f"[ERROR] Error sending an email: {e}")
+        # В очередь: письмо отправит send_queued_emails, регистрация не ждёт SMTP
+        queue_email(subject, message, recipient_list, from_email)
 
 from django.db.models import Q
+from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
+
 
 class CargoViewSet(viewsets.ModelViewSet):
     queryset = Cargo.objects.all()  # 👈 ОБЯЗАТЕЛЬНО
@@ -107,6 +122,19 @@ class CargoViewSet(viewsets.ModelViewSet):
             show_in_available_cargo=False  # ❗️Отключаем
         )
 
+    # POST /api/cargo/bulk/ — JSON-массив или CSV
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, CSVParser, MultiPartParser])
+    def bulk(self, request):
+        importer = CargoBulkImport(request.user)
+        if not importer.is_valid(get_bulk_rows(request)):
+            return Response({'errors': importer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        created = importer.save()
+        return Response({
+            'created': len(created),
+            'order_numbers': [cargo.order_number for cargo in created],
+        }, status=status.HTTP_201_CREATED)
+
 
 
 
@@ -148,6 +176,7 @@ class UserProfileAPIView(generics.RetrieveUpdateAPIView):
 
 class VerifyEmailCodeView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [VerifyEmailIPThrottle, VerifyEmailAccountThrottle]
 
     def post(self, request):
         email = request.data.get('email')
@@ -164,7 +193,7 @@ class VerifyEmailCodeView(APIView):
                 user.is_active = True
                 user.save()
                 verification.delete()
-                refresh = RefreshToken.for_user(user)
+                refresh = PrincipalRefreshToken.for_user(user)
                 return Response({
                     'message': _('Аккаунт успешно подтверждён!'),
                     'token': str(refresh.access_token),
@@ -194,6 +223,19 @@ class TruckViewSet(viewsets.ModelViewSet):
             show_in_available_vehicles=False
         )
 
+    # POST /api/trucks/bulk/ — JSON-массив или CSV
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, CSVParser, MultiPartParser])
+    def bulk(self, request):
+        importer = TruckBulkImport(request.user)
+        if not importer.is_valid(get_bulk_rows(request)):
+            return Response({'errors': importer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        created = importer.save()
+        return Response({
+            'created': len(created),
+            'order_numbers': [truck.order_number for truck in created],
+        }, status=status.HTTP_201_CREATED)
+
 
 
 
@@ -206,8 +248,8 @@ class TruckListCreateView(generics.ListCreateAPIView):
         return Truck.objects.filter(user=self.request.user)
 
 
-from rest_framework.decorators import api_view
-from .models import RegisteredCompany, SuspiciousAttempt
+from rest_framework.decorators import api_view, throttle_classes
+from .models import RegisteredCompany
 
 def normalize_code(code):
     print(f"[DEBUG] Raw input code: '{code}'")
@@ -217,6 +259,7 @@ def normalize_code(code):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([CompanyCodeIPThrottle])
 def validate_company_code(request):
     country = request.data.get('country')
     code = request.data.get('code')
@@ -227,11 +270,8 @@ def validate_company_code(request):
     normalized_code = normalize_code(code)
 
     if RegisteredCompany.objects.filter(code__iexact=normalized_code).exists():
-        SuspiciousAttempt.objects.create(
-            country=country,
-            code=normalized_code,
-            ip_address=ip_address
-        )
+        # Не строка на каждый запрос: повторы копятся в памяти и пишутся пачкой
+        suspicious_attempts.record(country, normalized_code, ip_address)
         return Response({
             "valid": False,
             "message": _("🚫 Компанія з таким кодом вже зареєстрована. Якщо ви вважаєте це помилкою — зв'яжіться з підтримкою.")
@@ -254,16 +294,102 @@ class CompanyDocumentUploadView(APIView):
     parser_classes = [MultiPartParser, FormParser]
 
     def post(self, request, *args, **kwargs):
+        # Файлы пишутся на диск по мере приёма, тип/размер/sha256 считаются на лету
+        use_streaming_uploads(request, max_size=DOCUMENT_MAX_SIZE)
         files = request.FILES.getlist('files')
-        documents = []
 
+        errors = {}
         for file in files:
-            doc = CompanyDocument.objects.create(user=request.user, file=file)
-            documents.append(doc)
+            info = inspect_upload(file)
+            if info.truncated:
+                errors[file.name] = f"Розмір файлу не повинен перевищувати {DOCUMENT_MAX_SIZE // (1024 * 1024)}MB."
+            elif info.content_type not in DOCUMENT_CONTENT_TYPES:
+                errors[file.name] = "Дозволені формати: PDF, JPG, JPEG, PNG, WEBP."
+        if errors:
+            return Response({'errors': errors}, status=400)
+
+        documents = [
+            CompanyDocument(
+                user=request.user, file=file, original_name=file.name, sha256=file.upload_info.sha256,
+                size=file.upload_info.size, content_type=file.upload_info.content_type,
+            )
+            for file in files
+        ]
+        # Файлы сохраняются в хранилище в pre_save поля, строки — одним INSERT
+        try:
+            with transaction.atomic():
+                CompanyDocument.objects.bulk_create(documents)
+                # bulk_create не вызывает save — ссылки на блобы отмечаем сами
+                for document in documents:
+                    retain_blobs([document.file.name])
+        except Exception:
+            for document in documents:
+                if document.file.name:
+                    document.file.storage.delete(document.file.name)
+            raise
 
         serializer = CompanyDocumentSerializer(documents, many=True)
         return Response(serializer.data, status=201)
 
+
+# Возобновляемая загрузка документов: POST — создать сессию, PUT с заголовком
+# Upload-Offset — дописать кусок, GET — узнать offset после обрыва, finalize — создать документ
+class UploadSessionCreateView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        session = UploadSession.create(request.user.pk, request.data.get('filename'), request.data.get('size'))
+        return Response(session.to_dict(), status=201)
+
+
+class UploadSessionView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, session_id):
+        session = UploadSession.load(session_id, request.user.pk)
+        return Response(session.to_dict(), headers={'Upload-Offset': str(session.offset)})
+
+    def put(self, request, session_id):
+        session = UploadSession.load(session_id, request.user.pk)
+        try:
+            offset = int(request.headers.get('Upload-Offset', request.query_params.get('offset', '')))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return Response({'error': 'Upload-Offset and Content-Length are required'}, status=400)
+
+        # Тело читается из потока блоками, request.data не трогаем
+        stream = request.stream if length else None
+        offset = session.append(offset, stream, length) if stream is not None else session.offset
+        return Response({'offset': offset, 'size': session.size}, headers={'Upload-Offset': str(offset)})
+
+    def delete(self, request, session_id):
+        UploadSession.load(session_id, request.user.pk).delete()
+        return Response(status=204)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def finalize_upload_session(request, session_id):
+    session = UploadSession.load(session_id, request.user.pk)
+    if not session.is_complete:
+        raise UploadOffsetConflict(f'Принято {session.offset} из {session.size} байт.')
+
+    with session.open_file() as file:
+        info = inspect_upload(file)
+        if info.content_type not in DOCUMENT_CONTENT_TYPES:
+            return Response({'errors': {session.filename: "Дозволені формати: PDF, JPG, JPEG, PNG, WEBP."}}, status=400)
+        expected_sha256 = request.data.get('sha256')
+        if expected_sha256 and expected_sha256.lower() != info.sha256:
+            return Response({'errors': {session.filename: 'Контрольная сумма не совпадает.'}}, status=400)
+
+        document = CompanyDocument.objects.create(
+            user=request.user, file=file, original_name=session.filename,
+            sha256=info.sha256, size=info.size, content_type=info.content_type,
+        )
+
+    session.delete()
+    return Response(CompanyDocumentSerializer(document).data, status=201)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def check_documents_approval(request):
@@ -279,7 +405,8 @@ def check_documents_approval(request):
     is_member = False
 
     registered_company = None
-    team_member = TeamMember.objects.select_related('company__registered_company', 'user').filter(user=user).first()
+    principal = get_principal(user)
+    team_member = principal.team_member
 
     if team_member:
         team_company = team_member.company
@@ -312,7 +439,7 @@ def check_documents_approval(request):
 
     # 2. Если не сотрудник — может, владелец
     if not is_member:
-        registered_company = RegisteredCompany.objects.filter(registered_by=user).first()
+        registered_company = principal.owned_registered_company
         is_owner = True if registered_company else False
 
         if profile and registered_company:
@@ -428,6 +555,7 @@ class CompanyProfileByNameView(APIView):
             "activity": profile.client_type or '',
             "country": registered_company.country if registered_company else '',
             "company_photo_url": request.build_absolute_uri(profile.company_photo.url) if profile.company_photo else None,
+            "company_photo_thumbnails": get_thumbnail_urls(profile, request),
             "city": profile.city or '',
             "canton": profile.canton or '',
             "viber_whatsapp": profile.viber_whatsapp_number or '',
@@ -437,69 +565,117 @@ class CompanyProfileByNameView(APIView):
 
 
 
+class ListingRowsMixin:
+    """
+    list() для витрин: строки читаются через .values() одним запросом
+    (вместе с профилем владельца) и сериализуются CargoRowSerializer/TruckRowSerializer.
+    """
+    row_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        row_serializer = self.row_serializer_class(request)
+        queryset = row_serializer.project(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(row_serializer.serialize(page))
+        return Response(row_serializer.serialize(queryset))
+
+
+class BoardETagMixin:
+    """
+    Conditional GET для витрин и поиска: ETag считается из версии витрин
+    без запросов к БД, при совпадении If-None-Match отдаём 304.
+    """
+    board_endpoint = None
+
+    def list(self, request, *args, **kwargs):
+        etag = board_etag(self.board_endpoint, request)
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
+
+
+class CachedBoardMixin(ListingRowsMixin):
+    """
+    Витрина из кэша: ключ — эндпоинт, параметры запроса и версия витрин
+    (поднимается сигналами при изменении Cargo/Truck/BookingRequest).
+    В кэше лежат строки без статуса, статус пользователя накладывается сверху.
+    """
+    board_endpoint = None
+
+    def list(self, request, *args, **kwargs):
+        row_serializer = self.row_serializer_class(request)
+
+        def build():
+            queryset = row_serializer.project(self.filter_queryset(self.get_queryset()))
+            return row_serializer.serialize(queryset, with_status=False)
+
+        data = get_or_build(board_cache_key(self.board_endpoint, request), build)
+        return Response(row_serializer.overlay_statuses(data))
+
+
 # Грузы для главной страницы
-class MainPageCargoView(generics.ListAPIView):
+class MainPageCargoView(BoardETagMixin, CachedBoardMixin, generics.ListAPIView):
     serializer_class = CargoSerializer
+    row_serializer_class = CargoRowSerializer
     permission_classes = [AllowAny]
+    board_endpoint = 'main-cargo'
 
     def get_queryset(self):
-        finished_cargo_ids = BookingRequest.objects.filter(
-            status__in=["Finished", "Cancelled", "Rejected"]
-        ).values_list('cargo_id', flat=True)
-
         return Cargo.objects.filter(
-            show_on_main=True
-        ).exclude(id__in=finished_cargo_ids)
+            show_on_main=True,
+            availability__in=MAIN_PAGE_AVAILABILITY
+        ).order_by('-created_at')
 
 
 # Грузы для "Available Cargo"
-class AvailableCargoView(generics.ListAPIView):
+class AvailableCargoView(BoardETagMixin, CachedBoardMixin, generics.ListAPIView):
     serializer_class = CargoSerializer
+    row_serializer_class = CargoRowSerializer
     permission_classes = [AllowAny]
+    board_endpoint = 'available-cargo'
 
     def get_queryset(self):
-        # Все занятые грузы
-        finished_cargo_ids = BookingRequest.objects.filter(
-            status__in=["Finished", "Cancelled", "Accepted"],
-            cargo__isnull=False
-        ).values_list('cargo_id', flat=True)
-
+        # Занятые грузы отсекаются по availability
         return Cargo.objects.filter(
-            show_in_available_cargo=True
-        ).exclude(id__in=finished_cargo_ids)
+            show_in_available_cargo=True,
+            availability__in=AVAILABLE_BOARD_AVAILABILITY
+        ).order_by('-created_at')
 
 
 
 
 # Машины для главной страницы
-class MainPageTruckView(generics.ListAPIView):
+class MainPageTruckView(BoardETagMixin, CachedBoardMixin, generics.ListAPIView):
     serializer_class = TruckSerializer
+    row_serializer_class = TruckRowSerializer
     permission_classes = [AllowAny]
+    board_endpoint = 'main-truck'
 
     def get_queryset(self):
-        finished_truck_ids = BookingRequest.objects.filter(
-            status__in=["Finished", "Cancelled", "Rejected"]
-        ).values_list('truck_id', flat=True)
-
         return Truck.objects.filter(
-            show_on_main=True
-        ).exclude(id__in=finished_truck_ids)
+            show_on_main=True,
+            availability__in=MAIN_PAGE_AVAILABILITY
+        ).order_by('-created_at')
 
 # Машины для "Available Vehicles"
-class AvailableTruckView(generics.ListAPIView):
+class AvailableTruckView(BoardETagMixin, CachedBoardMixin, generics.ListAPIView):
     serializer_class = TruckSerializer
+    row_serializer_class = TruckRowSerializer
     permission_classes = [AllowAny]
+    board_endpoint = 'available-truck'
 
     def get_queryset(self):
-        # Все занятые машины
-        finished_truck_ids = BookingRequest.objects.filter(
-            status__in=["Finished", "Cancelled", "Accepted"],
-            truck__isnull=False
-        ).values_list('truck_id', flat=True)
-
+        # Занятые машины отсекаются по availability
         return Truck.objects.filter(
-            show_in_available_vehicles=True
-        ).exclude(id__in=finished_truck_ids)
+            show_in_available_vehicles=True,
+            availability__in=AVAILABLE_BOARD_AVAILABILITY
+        ).order_by('-created_at')
 
 
 
@@ -517,7 +693,7 @@ def sent_requests_view(request):
 
     # Если user_id не передан — вернём заявки текущего юзера
     if not user_id:
-        qs = BookingRequest.objects.filter(sender=user)
+        qs = inbox_queryset('sent', user.pk)
         serializer = BookingRequestSerializer(qs, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -535,7 +711,7 @@ def sent_requests_view(request):
         return Response({"error": "User not in your team"}, status=403)
 
     # Всё ок — возвращаем заявки выбранного сотрудника
-    qs = BookingRequest.objects.filter(sender_id=user_id)
+    qs = inbox_queryset('sent', user_id)
     serializer = BookingRequestSerializer(qs, many=True, context={'request': request})
     return Response(serializer.data)
 
@@ -548,7 +724,7 @@ def received_requests_view(request):
     user_id = request.query_params.get("user_id")
 
     if not user_id:
-        qs = BookingRequest.objects.filter(receiver=user, status="Waiting")
+        qs = inbox_queryset('received', user.pk)
         serializer = BookingRequestSerializer(qs, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -561,7 +737,7 @@ def received_requests_view(request):
     except TeamMember.DoesNotExist:
         return Response({"error": "User not in your team"}, status=403)
 
-    qs = BookingRequest.objects.filter(receiver_id=user_id, status="Waiting")
+    qs = inbox_queryset('received', user_id)
     serializer = BookingRequestSerializer(qs, many=True, context={'request': request})
     return Response(serializer.data)
 
@@ -573,9 +749,7 @@ def active_requests_view(request):
     user_id = request.query_params.get("user_id")
 
     if not user_id:
-        qs = BookingRequest.objects.filter(
-            status="Accepted"
-        ).filter(models.Q(sender=user) | models.Q(receiver=user))
+        qs = inbox_queryset('active', user.pk)
         serializer = BookingRequestSerializer(qs, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -588,9 +762,7 @@ def active_requests_view(request):
     except TeamMember.DoesNotExist:
         return Response({"error": "User not in your team"}, status=403)
 
-    qs = BookingRequest.objects.filter(
-        status="Accepted"
-    ).filter(models.Q(sender_id=user_id) | models.Q(receiver_id=user_id))
+    qs = inbox_queryset('active', user_id)
 
     serializer = BookingRequestSerializer(qs, many=True, context={'request': request})
     return Response(serializer.data)
@@ -605,12 +777,7 @@ def archived_requests_view(request):
     user_id = request.query_params.get("user_id")
 
     if not user_id:
-        qs = BookingRequest.objects.filter(
-            status="Finished"
-        ).filter(
-            (models.Q(sender=user) & models.Q(sender_deleted=False)) |
-            (models.Q(receiver=user) & models.Q(receiver_deleted=False))
-        )
+        qs = inbox_queryset('archived', user.pk)
         serializer = BookingRequestSerializer(qs, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -623,16 +790,37 @@ def archived_requests_view(request):
     except TeamMember.DoesNotExist:
         return Response({"error": "User not in your team"}, status=403)
 
-    qs = BookingRequest.objects.filter(
-        status="Finished"
-    ).filter(
-        (models.Q(sender_id=user_id) & models.Q(sender_deleted=False)) |
-        (models.Q(receiver_id=user_id) & models.Q(receiver_deleted=False))
-    )
+    qs = inbox_queryset('archived', user_id)
 
     serializer = BookingRequestSerializer(qs, many=True, context={'request': request})
     return Response(serializer.data)
 
+class BookingInboxView(generics.ListAPIView):
+    """
+    Единый ящик заявок: ?box=sent|received|active|archived, ?user_id= — как в
+    старых *_requests_view. Курсорная пагинация по created_at.
+    """
+    serializer_class = BookingRequestSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_ordering(self):
+        return '-created_at'
+
+    def get_queryset(self):
+        box = self.request.query_params.get('box', 'sent')
+        if box not in INBOX_BOXES:
+            raise serializers.ValidationError({'box': f"Expected one of: {', '.join(INBOX_BOXES)}"})
+        return inbox_queryset(box, get_inbox_user_id(self.request))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def booking_counters_view(request):
+    # Бейджи: sent/received/active/archived + unread_notifications
+    return Response(get_inbox_counters(get_inbox_user_id(request)))
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def soft_delete_booking_for_user(request, booking_id):
@@ -660,13 +848,21 @@ def company_photo_view(request):
 
     if request.method == 'GET':
         if profile.company_photo:
-            return Response({"photo_url": request.build_absolute_uri(profile.company_photo.url)})
+            return Response({
+                "photo_url": request.build_absolute_uri(profile.company_photo.url),
+                "thumbnails": get_thumbnail_urls(profile, request),  # None, пока воркер их не построил
+            })
         return Response({"photo_url": "/static/images/no-photo-placeholder.png"})
 
     elif request.method == 'POST':
+        use_streaming_uploads(request, max_size=PHOTO_MAX_SIZE)
         photo = request.FILES.get('company_photo')
         if not photo:
             return Response({"error": "No photo provided"}, status=400)
+        try:
+            validate_company_file(photo)  # сигнатура и заголовок, без декодирования
+        except DjangoValidationError as exc:
+            return Response({"error": exc.messages[0]}, status=400)
 
         profile.company_photo = photo
         profile.save()
@@ -714,10 +910,12 @@ class BookingRequestListCreateView(generics.ListCreateAPIView):
         else:
             raise serializers.ValidationError("Нужно указать cargo или truck")
 
-        serializer.save(sender=sender, receiver=receiver)
-        # 🔔 Уведомление получателю
-        if receiver:
-            send_notification_to_user(receiver.id, f"Вам поступил новый запрос от {sender.username}")
+        # Заявка и уведомление — одной транзакцией (уведомление уйдёт через outbox)
+        with transaction.atomic():
+            serializer.save(sender=sender, receiver=receiver)
+            # 🔔 Уведомление получателю
+            if receiver:
+                send_notification_to_user(receiver.id, f"Вам поступил новый запрос от {sender.username}")
 
 class BookingRequestDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = BookingRequest.objects.all()
@@ -740,20 +938,21 @@ class BookingRequestDetailView(generics.RetrieveUpdateDestroyAPIView):
         if new_status not in ["Accepted", "Rejected", "Finished", "Cancelled"]:
             return Response({"error": "Неверный статус."}, status=400)
 
-        instance.status = new_status
-        instance.save()
+        with transaction.atomic():
+            # Условный UPDATE; неразрешённый переход — 400, заявку уже изменили параллельно — 409
+            transition_booking(instance, new_status)
 
-        # 🔔 Отправка уведомлений обеим сторонам
-        if new_status == "Accepted":
-            send_notification_to_user(instance.sender.id, f"Ваш запрос был принят {instance.receiver.username}")
-            send_notification_to_user(instance.receiver.id, f"Вы приняли запрос от {instance.sender.username}")
+            # 🔔 Уведомления обеим сторонам (в outbox, той же транзакцией)
+            if new_status == "Accepted":
+                send_notification_to_user(instance.sender.id, f"Ваш запрос был принят {instance.receiver.username}")
+                send_notification_to_user(instance.receiver.id, f"Вы приняли запрос от {instance.sender.username}")
 
-        elif new_status == "Rejected":
-            send_notification_to_user(instance.sender.id, f"Ваш запрос был отклонён {instance.receiver.username}")
+            elif new_status == "Rejected":
+                send_notification_to_user(instance.sender.id, f"Ваш запрос был отклонён {instance.receiver.username}")
 
-        elif new_status == "Finished":
-            send_notification_to_user(instance.sender.id, f"Ваш заказ завершён {instance.receiver.username}")
-            send_notification_to_user(instance.receiver.id, f"Вы завершили заказ с {instance.sender.username}")
+            elif new_status == "Finished":
+                send_notification_to_user(instance.sender.id, f"Ваш заказ завершён {instance.receiver.username}")
+                send_notification_to_user(instance.receiver.id, f"Вы завершили заказ с {instance.sender.username}")
 
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
@@ -781,39 +980,26 @@ class BookingRequestDetailView(generics.RetrieveUpdateDestroyAPIView):
             instance.save()
 
 
-def send_notification_to_user(user_id, message):
-    try:
-        profile = Profile.objects.get(user_id=user_id)
-        if not profile.notifications_enabled:
-            print(f"[INFO] Уведомления отключены для user_id={user_id}")
-            return  # ⛔ Не отправляем
-    except Profile.DoesNotExist:
-        print(f"[WARNING] Профиль не найден для user_id={user_id}")
-        return
-
-    # 1. Сохраняем в базу
-    Notification.objects.create(
-        receiver_id=user_id,
-        message=message
-    )
-
-    # 2. Отправляем по WebSocket
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"user_{user_id}",
-        {
-            "type": "send_notification",
-            "message": message
-        }
-    )
-
-
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_notifications(request):
-    notifications = Notification.objects.filter(receiver=request.user).order_by('-created_at')
+    notifications = Notification.objects.filter(receiver=request.user)
+
+    # Валидатор одним агрегатом, без выборки самих уведомлений
+    state = notifications.aggregate(
+        last_id=models.Max('id'),
+        last_created=models.Max('created_at'),
+        total=models.Count('id'),
+        unread=models.Count('id', filter=models.Q(is_read=False)),
+    )
+    etag = make_etag('notifications', request.user.pk, *state.values())
+    not_modified = not_modified_response(request, etag)
+    if not_modified is not None:
+        return not_modified
+
+    notifications = notifications.order_by('-created_at')
     serializer = NotificationSerializer(notifications, many=True)
-    return Response(serializer.data)
+    return Response(serializer.data, headers={'ETag': etag})
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -902,8 +1088,10 @@ def get_company_info(request):
     user = request.user
     profile = getattr(user, 'profile', None)
 
+    principal = get_principal(user)
+
     # 1. Если пользователь — сотрудник (TeamMember)
-    team_member = TeamMember.objects.select_related('company__registered_company').filter(user=user).first()
+    team_member = principal.team_member
     if team_member:
         company = team_member.company
         registered = company.registered_company
@@ -916,7 +1104,7 @@ def get_company_info(request):
         })
 
     # 2. Если пользователь — владелец (зарегистрировал компанию)
-    registered = RegisteredCompany.objects.filter(registered_by=user).first()
+    registered = principal.owned_registered_company
     if registered and profile:
         return Response({
             'name': profile.company or '',
@@ -928,61 +1116,59 @@ def get_company_info(request):
 
     return Response({'error': 'Company not found'}, status=404)
 
-class SearchCargoView(generics.ListAPIView):
+class SearchCargoView(BoardETagMixin, ListingRowsMixin, generics.ListAPIView):
     serializer_class = CargoSerializer
+    row_serializer_class = CargoRowSerializer
     permission_classes = [IsAuthenticated]
-
-    def get_queryset(self):
-        finished_cargo_ids = BookingRequest.objects.filter(
-            status__in=["Finished", "Cancelled"],
-            cargo__isnull=False
-        ).values_list('cargo_id', flat=True)
-
+    pagination_class = KeysetPagination
+    board_endpoint = 'search-cargo'
+
+    sort_map = {
+        'createdAt_desc': '-created_at',
+        'createdAt_asc': 'created_at',
+        'price_asc': 'price',
+        'price_desc': '-price',
+        'pickupDate_asc': 'date_from',
+        'pickupDate_desc': '-date_from',
+        'weight_asc': 'weight',
+        'weight_desc': '-weight'
+    }
+
+    def get_ordering(self):
         sort_param = self.request.query_params.get('sort', 'createdAt_desc')
+        return self.sort_map.get(sort_param, '-created_at')
 
-        sort_map = {
-            'createdAt_desc': '-created_at',
-            'createdAt_asc': 'created_at',
-            'price_asc': 'price',
-            'price_desc': '-price',
-            'pickupDate_asc': 'pickup_date',
-            'pickupDate_desc': '-pickup_date',
-            'weight_asc': 'weight',
-            'weight_desc': '-weight'
-        }
-
-        ordering = sort_map.get(sort_param, '-created_at')
-
-        return Cargo.objects.exclude(id__in=finished_cargo_ids).order_by(ordering)
+    def get_queryset(self):
+        # Сортировку и курсор применяет KeysetPagination
+        return Cargo.objects.filter(availability__in=SEARCH_AVAILABILITY)
 
 
 
-class SearchTruckView(generics.ListAPIView):
+class SearchTruckView(BoardETagMixin, ListingRowsMixin, generics.ListAPIView):
     serializer_class = TruckSerializer
+    row_serializer_class = TruckRowSerializer
     permission_classes = [IsAuthenticated]
-
-    def get_queryset(self):
-        finished_truck_ids = BookingRequest.objects.filter(
-            status__in=["Finished", "Cancelled"],
-            truck__isnull=False
-        ).values_list('truck_id', flat=True)
-
+    pagination_class = KeysetPagination
+    board_endpoint = 'search-truck'
+
+    sort_map = {
+        'createdAt_desc': '-created_at',
+        'createdAt_asc': 'created_at',
+        'price_asc': 'price',
+        'price_desc': '-price',
+        'availableDate_asc': 'loading_date_from',
+        'availableDate_desc': '-loading_date_from',
+        'capacity_asc': 'carrying_capacity',
+        'capacity_desc': '-carrying_capacity'
+    }
+
+    def get_ordering(self):
         sort_param = self.request.query_params.get('sort', 'createdAt_desc')
+        return self.sort_map.get(sort_param, '-created_at')
 
-        sort_map = {
-            'createdAt_desc': '-created_at',
-            'createdAt_asc': 'created_at',
-            'price_asc': 'price',
-            'price_desc': '-price',
-            'availableDate_asc': 'loading_date_from',
-            'availableDate_desc': '-loading_date_from',
-            'capacity_asc': 'carrying_capacity',
-            'capacity_desc': '-carrying_capacity'
-        }
-
-        ordering = sort_map.get(sort_param, '-created_at')
-
-        return Truck.objects.exclude(id__in=finished_truck_ids).order_by(ordering)
+    def get_queryset(self):
+        # Сортировку и курсор применяет KeysetPagination
+        return Truck.objects.filter(availability__in=SEARCH_AVAILABILITY)
 
 
 class GetTeamMembersView(APIView):
@@ -1066,35 +1252,48 @@ def find_order_by_number(request):
 
 
 
+def two_factor_qr_payload(request, secret):
+    user = request.user
+    payload = {
+        "secret": secret,
+        # Картинка по запросу с Authorization (fetch → blob URL), не кэшируется
+        "qr_code_url": request.build_absolute_uri(reverse('2fa-qr-image', args=[make_qr_token(user, secret)])),
+    }
+    # Встроенная картинка — только по ?inline=1, для старого фронтенда
+    if request.query_params.get('inline') == '1':
+        png = get_qr_png(user, secret)  # из кэша, рисуется один раз на (user, secret)
+        payload["qr_code_base64"] = f"data:image/png;base64,{base64.b64encode(png).decode()}"
+    return payload
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def generate_2fa_qr(request):
-    user_profile = request.user.profile
-
     # Генерируем секрет (если его ещё нет)
-    if not user_profile.two_factor_secret:
-        secret = pyotp.random_base32()
-        user_profile.two_factor_secret = secret
-        user_profile.save()
-    else:
-        secret = user_profile.two_factor_secret
-
-    # Формируем otpauth URI
-    otp_uri = pyotp.totp.TOTP(secret).provisioning_uri(
-        name=request.user.email,
-        issuer_name="Platforma"
-    )
+    secret = get_or_create_secret(request.user.profile)
+    return Response(two_factor_qr_payload(request, secret))
 
-    # Генерация QR-кода → base64
-    qr = qrcode.make(otp_uri)
-    buffer = io.BytesIO()
-    qr.save(buffer, format="PNG")
-    qr_b64 = base64.b64encode(buffer.getvalue()).decode()
 
-    return Response({
-        "qr_code_base64": f"data:image/png;base64,{qr_b64}",
-        "secret": secret
-    })
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def two_factor_qr_image(request, token):
+    # Ссылка подписана и живёт QR_URL_MAX_AGE; чужая, после смены секрета
+    # или после включения 2FA — 404: QR содержит секрет
+    payload = read_qr_token(token)
+    if payload is None or payload[0] != request.user.pk:
+        return Response({"error": "Not found"}, status=404)
+    fingerprint = payload[1]
+
+    # Профиль — из БД, а не закэшированный на request.user: важно свежее is_2fa_enabled
+    profile = Profile.objects.filter(user_id=request.user.pk).first()
+    if (not profile or not profile.two_factor_secret or profile.is_2fa_enabled
+            or secret_fingerprint(profile.two_factor_secret) != fingerprint):
+        return Response({"error": "Not found"}, status=404)
+
+    response = HttpResponse(get_qr_png(request.user, profile.two_factor_secret), content_type='image/png')
+    # Ни браузер, ни прокси не должны сохранять картинку с секретом
+    response['Cache-Control'] = 'no-store'
+    return response
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -1113,7 +1312,7 @@ def verify_2fa_code(request):
     if totp.verify(code, valid_window=1):
         user_profile.is_2fa_enabled = True
 
-        user_profile.save()
+        user_profile.save(update_fields=['is_2fa_enabled'])
         print("✅ 2FA подтверждена и сохранена!")  # ← это выведется в терминал
         print("[DEBUG] is_2fa_enabled:", user_profile.is_2fa_enabled)
         return Response({"success": "2FA включена"})
@@ -1125,26 +1324,9 @@ class Generate2FAView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-
-        # 1. Генерируем секрет
-        secret = pyotp.random_base32()
-        user.profile.two_factor_secret = secret
-        user.profile.save()
-
-        # 2. Генерируем URL для Google Authenticator
-        otp_uri = pyotp.totp.TOTP(secret).provisioning_uri(name=user.email, issuer_name="Platforma")
-
-        # 3. Генерируем QR-код
-        qr = qrcode.make(otp_uri)
-        buffer = io.BytesIO()
-        qr.save(buffer, format="PNG")
-        qr_code_base64 = base64.b64encode(buffer.getvalue()).decode()
-
-        return Response({
-            "secret": secret,
-            "qr_code_base64": f"data:image/png;base64,{qr_code_base64}"
-        })
+        # Секрет создаётся один раз: повторный запрос отдаёт тот же QR из кэша
+        secret = get_or_create_secret(request.user.profile)
+        return Response(two_factor_qr_payload(request, secret))
 
 class Verify2FAView(APIView):
     permission_classes = [IsAuthenticated]
@@ -1158,8 +1340,8 @@ class Verify2FAView(APIView):
 
         totp = pyotp.TOTP(user.profile.two_factor_secret)
         if totp.verify(code):
-            user.profile.is_two_factor_enabled = True
-            user.profile.save()
+            user.profile.is_2fa_enabled = True
+            user.profile.save(update_fields=['is_2fa_enabled'])
             return Response({"detail": "2FA включена!"})
         else:
             return Response({"detail": "Неверный код"}, status=status.HTTP_400_BAD_REQUEST)
@@ -1173,12 +1355,13 @@ class Disable2FAView(APIView):
 
         profile.is_2fa_enabled = False  # ← правильное поле
         profile.two_factor_secret = ''
-        profile.save()
+        profile.save(update_fields=['is_2fa_enabled', 'two_factor_secret'])
 
         return Response({"detail": "2FA отключена!"}, status=status.HTTP_200_OK)
 
 class Verify2FALoginView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [TwoFactorIPThrottle, TwoFactorAccountThrottle]
 
     def post(self, request):
         email = request.data.get("email")
@@ -1201,7 +1384,7 @@ class Verify2FALoginView(APIView):
             return Response({"error": "Неверный код"}, status=400)
 
         # ✅ Если код верный — выдаём токен
-        refresh = RefreshToken.for_user(user)
+        refresh = PrincipalRefreshToken.for_user(user)
         return Response({
             "access": str(refresh.access_token),
             "refresh": str(refresh)
@@ -1222,7 +1405,8 @@ class ChangePasswordView(APIView):
             return Response({"error": "Неверный старый пароль"}, status=400)
 
         user.set_password(new_password)
-        user.save()
+        # Только пароль: request.user может быть копией из кэша, остальные поля не перезаписываем
+        user.save(update_fields=['password'])
         return Response({"message": "Пароль успешно изменён"})
 
 
@@ -1238,7 +1422,7 @@ def notifications_toggle_view(request):
         new_value = request.data.get('notifications_enabled')
         if new_value is not None:
             profile.notifications_enabled = new_value in ['true', 'True', True, 1, '1']
-            profile.save()
+            profile.save(update_fields=['notifications_enabled'])
             return Response({'notifications_enabled': profile.notifications_enabled})
         else:
             return Response({'error': 'Missing notifications_enabled'}, status=400) 
@@ -1291,6 +1475,29 @@ def get_user_rating(request, user_id):
         "reviews": total
     })
 
+RATINGS_BATCH_MAX_IDS = 500
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_users_ratings(request):
+    """
+    Рейтинги нескольких пользователей одним запросом: ?ids=1,2,3.
+    Ответ — {id: {"rating", "reviews"}} в формате /api/user/<id>/rating/.
+    """
+    try:
+        user_ids = {int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()}
+    except ValueError:
+        return Response({"error": "ids must be a comma-separated list of integers"}, status=400)
+
+    if len(user_ids) > RATINGS_BATCH_MAX_IDS:
+        return Response({"error": f"Too many ids (max {RATINGS_BATCH_MAX_IDS})"}, status=400)
+
+    ratings = {user_id: {"rating": 0, "reviews": 0} for user_id in user_ids}
+    for summary in UserRatingSummary.objects.filter(user_id__in=user_ids):
+        ratings[summary.user_id] = {"rating": summary.average, "reviews": summary.rating_count}
+    return Response(ratings)
+
 from django.http import JsonResponse
 from django.contrib.auth import get_user_model
 
@@ -1,18 +1,84 @@
+import asyncio
 import os
-import django
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from django.core.asgi import get_asgi_application
-import api.routing  # ты создашь этот файл позже
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from asgiref.wsgi import WsgiToAsgiInstance
+from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
-django.setup()
+# Сначала настраиваем Django: api.routing импортирует модели
+django_wsgi_app = get_wsgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+
+import api.routing  # noqa: E402
+
+
+# Одновременных HTTP-запросов на воркер; каждый держит своё соединение с БД
+HTTP_THREADS = int(os.getenv('WEB_HTTP_THREADS', '8'))
+BODY_SPOOL_SIZE = 1024 * 1024  # тело запроса больше — во временный файл
+
+
+class WSGIHTTPApplication:
+    """
+    HTTP через обычный WSGI-обработчик Django: запрос целиком выполняется
+    в одном потоке из пула. Все вьюхи и middleware синхронные, а
+    ASGI-обработчик Django переключается между event loop и потоком на
+    каждом middleware (≈40 раз на запрос) — здесь переключение одно.
+    WebSocket при этом обслуживает тот же процесс (Channels).
+    """
+
+    def __init__(self, wsgi_application, threads=HTTP_THREADS):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+
+    async def __call__(self, scope, receive, send):
+        with SpooledTemporaryFile(max_size=BODY_SPOOL_SIZE) as body:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self.run, scope, body, loop, send)
+
+    def run(self, scope, body, loop, send):
+        # environ собирается так же, как в asgiref.wsgi.WsgiToAsgi
+        instance = WsgiToAsgiInstance(self.wsgi_application)
+        instance.scope = scope
+        environ = instance.build_environ(scope, body)
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]
+
+        result = self.wsgi_application(environ, start_response)
+        try:
+            send_from_thread({'type': 'http.response.start', **started})
+            for chunk in result:
+                if chunk:
+                    send_from_thread({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            send_from_thread({'type': 'http.response.body', 'body': b''})
+        finally:
+            # request_finished: Django закрывает соединение с БД этого потока
+            if hasattr(result, 'close'):
+                result.close()
+
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
-        URLRouter(
-            api.routing.websocket_urlpatterns
-        )
+    "http": WSGIHTTPApplication(django_wsgi_app),
+    # Без AuthMiddlewareStack: сокет аутентифицируется JWT в NotificationConsumer
+    "websocket": URLRouter(
+        api.routing.websocket_urlpatterns
     ),
 })
@@ -0,0 +1,25 @@
+from uvicorn_worker import UvicornWorker
+
+
+class ASGIWorker(UvicornWorker):
+    """
+    Воркер gunicorn для backend.asgi: HTTP и WebSocket обслуживает один
+    процесс uvicorn. При остановке (деплой, рестарт dyno) он перестаёт
+    принимать соединения, закрывает сокеты кодом 1012 — клиент
+    переподключается к новому воркеру — и дожидается текущих запросов.
+    """
+    CONFIG_KWARGS = {
+        'loop': 'auto',
+        'http': 'auto',
+        'ws': 'auto',
+        # ProtocolTypeRouter не знает lifespan, без этого uvicorn пишет ошибку на старте
+        'lifespan': 'off',
+        # Пинги держат сокет живым дольше 55 с простоя, после которых роутер Heroku его рвёт
+        'ws_ping_interval': 20.0,
+        'ws_ping_timeout': 20.0,
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Самим закончить чуть раньше, чем gunicorn добьёт воркер по graceful_timeout
+        self.config.timeout_graceful_shutdown = max(self.cfg.graceful_timeout - 5, 1)
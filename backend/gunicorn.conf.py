@@ -0,0 +1,32 @@
+# Настройки gunicorn для backend.asgi:application (Procfile, процесс web).
+# Числа переопределяются переменными окружения без нового деплоя:
+#   heroku config:set WEB_CONCURRENCY=3
+import multiprocessing
+import os
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = 'backend.asgi_worker.ASGIWorker'
+
+# Heroku сам задаёт WEB_CONCURRENCY по размеру dyno; локально — по числу ядер.
+# Воркер асинхронный: сокеты и медленные клиенты не занимают процесс целиком,
+# так что воркеров нужно не больше ядер.
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4)))
+
+# SIGTERM при деплое: у Heroku 30 с до SIGKILL, уложиться в них
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '25'))
+# Воркер, который не отвечает мастеру дольше этого, перезапускается
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+# Роутер Heroku держит keep-alive до 90 с; меньше — и он получит закрытый сокет
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '75'))
+
+# Периодический перезапуск воркеров от утечек памяти; jitter — чтобы не все сразу
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '500'))
+
+# За роутером Heroku: доверяем X-Forwarded-For/Proto (request.is_secure(), IP клиента)
+forwarded_allow_ips = '*'
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
@@ -23,17 +23,37 @@ ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '*').split(',')
 # REST framework settings
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-    "api.auth.custom_jwt_auth.CustomJWTAuthentication",
+    "api.auth.custom_jwt_auth.ClaimsJWTAuthentication",
 ),
     "DEFAULT_PERMISSION_CLASSES": [
         'rest_framework.permissions.AllowAny',  # Разрешаем любые запросы
     ],
+    # Скользящее окно на вход, 2FA и проверку кодов (api/throttling.py),
+    # счётчики — в CACHES, общие для всех процессов при Redis
+    "DEFAULT_THROTTLE_RATES": {
+        'login-ip': os.getenv('THROTTLE_LOGIN_IP', '30/min'),
+        'login-account': os.getenv('THROTTLE_LOGIN_ACCOUNT', '10/min'),
+        '2fa-ip': os.getenv('THROTTLE_2FA_IP', '30/min'),
+        '2fa-account': os.getenv('THROTTLE_2FA_ACCOUNT', '5/min'),
+        'verify-email-ip': os.getenv('THROTTLE_VERIFY_EMAIL_IP', '30/min'),
+        'verify-email-account': os.getenv('THROTTLE_VERIFY_EMAIL_ACCOUNT', '5/min'),
+        'company-code-ip': os.getenv('THROTTLE_COMPANY_CODE_IP', '30/min'),
+    },
+    # IP клиента — последний адрес в X-Forwarded-For, его добавляет роутер Heroku
+    "NUM_PROXIES": int(os.getenv('NUM_PROXIES', '1')),
 }
 
 # JWT settings
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    # При обновлении access-токена claims (is_active) перечитываются.
+    # Деактивация пользователя (is_active=False) вступает в силу:
+    #  - сразу после коммита — в запросах, которые читают строку пользователя:
+    #    кэш пользователя версионируется в общем кэше (api/auth/user_cache.py);
+    #  - в эндпоинтах, которым хватает claims токена, — не позже
+    #    ACCESS_TOKEN_LIFETIME (30 мин); refresh-токен деактивированному не выдаст новый access.
+    "TOKEN_REFRESH_SERIALIZER": "api.auth.claims.PrincipalTokenRefreshSerializer",
 }
 
 # Installed apps
@@ -104,6 +124,12 @@ if DATABASE_URL:
     DATABASES['default'] = dj_database_url.parse(DATABASE_URL)
 
 # Password validation
+# Вход по email (api/auth/backends.py) — одна выборка и один хэш; ModelBackend — для админки
+AUTHENTICATION_BACKENDS = [
+    'api.auth.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -183,7 +209,10 @@ OUTLOOK_USE_TLS = True
 OUTLOOK_USER = os.getenv('OUTLOOK_USER')
 OUTLOOK_PASSWORD = os.getenv('OUTLOOK_PASSWORD')
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Письма отправляет воркер send_queued_emails. Для локальной разработки можно
+# EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend (письма в EMAIL_FILE_PATH)
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = os.getenv('EMAIL_FILE_PATH', str(BASE_DIR / 'sent_emails'))
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True').lower() == 'true'
@@ -201,6 +230,8 @@ CORS_ALLOWS_CREDENTIALS = True
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Незавершённые возобновляемые загрузки документов (см. api/resumable.py)
+RESUMABLE_UPLOAD_ROOT = os.getenv('RESUMABLE_UPLOAD_ROOT', os.path.join(BASE_DIR, 'upload_sessions'))
 
 ASGI_APPLICATION = 'backend.asgi.application'
 
@@ -215,6 +246,23 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Кэш (витрины, счётчики версий): Redis, если он задан в окружении,
+# иначе локальная память процесса — для разработки и тестов
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'platforma',
+        }
+    }
+
 # Security settings for production
 if not DEBUG:
     SECURE_BROWSER_XSS_FILTER = True
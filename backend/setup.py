@@ -17,6 +17,7 @@ setup(
         "python-dotenv",
         "channels",
         "channels-redis",
+        "redis",
         "Pillow",
         "pyotp",
         "qrcode",
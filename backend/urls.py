@@ -22,9 +22,11 @@ from api.views import (
     mark_notification_as_read, CreateTeamCompanyView, TeamMemberCreateView,
     TeamMemberListView, get_company_info, SearchCargoView, SearchTruckView,
     GetTeamMembersView, GetUserOrdersView, find_order_by_number, soft_delete_booking_for_user,
-    generate_2fa_qr, verify_2fa_code, Verify2FAView, Disable2FAView, Verify2FALoginView,
+    generate_2fa_qr, two_factor_qr_image, verify_2fa_code, Verify2FAView, Disable2FAView, Verify2FALoginView,
     ChangePasswordView, notifications_toggle_view, ReviewViewSet,
-    get_user_rating, get_user_rating_by_email, FrontendAppView,
+    get_user_rating, get_user_rating_by_email, FrontendAppView, BookingInboxView,
+    booking_counters_view, get_users_ratings,
+    UploadSessionCreateView, UploadSessionView, finalize_upload_session,
 )
 
 # 📦 Роутер для ViewSet'ов
@@ -45,6 +47,7 @@ urlpatterns = [
     path("api/user/verify/", VerifyEmailCodeView.as_view(), name="verify"),
 
     path("api/user/generate-2fa/", generate_2fa_qr, name="generate-2fa"),
+    path("api/user/2fa-qr/<str:token>.png", two_factor_qr_image, name="2fa-qr-image"),
 
     path("api/user/verify-2fa/", verify_2fa_code, name="verify-2fa"),
 
@@ -57,6 +60,7 @@ urlpatterns = [
     path('api/user/notifications-toggle/', notifications_toggle_view, name='notifications-toggle'),
 
     path("api/user/<int:user_id>/rating/", get_user_rating, name="user-rating"),
+    path("api/users/ratings/", get_users_ratings, name="users-ratings"),
 
     path('api/user-rating-by-email/', get_user_rating_by_email, name='user-rating-by-email'),
 
@@ -97,6 +101,9 @@ urlpatterns = [
     # 🏢 Компания
     path("api/validate-company-code/", validate_company_code, name="validate-company-code"),
     path('api/company/upload-documents/', CompanyDocumentUploadView.as_view(), name='upload-documents'),
+    path('api/company/upload-sessions/', UploadSessionCreateView.as_view(), name='upload-session-create'),
+    path('api/company/upload-sessions/<str:session_id>/', UploadSessionView.as_view(), name='upload-session'),
+    path('api/company/upload-sessions/<str:session_id>/finalize/', finalize_upload_session, name='upload-session-finalize'),
     path('api/company/check-approval/', check_documents_approval, name='check-documents-approval'),
     path('api/register-company/', register_company, name='register-company'),
     path('api/company-by-name/<str:name>/', CompanyProfileByNameView.as_view(), name='company-by-name'),
@@ -116,6 +123,8 @@ urlpatterns = [
     path('api/booking-requests/received/', received_requests_view, name='received-requests'),
     path('api/booking-requests/active/', active_requests_view, name='active-requests'),
     path('api/booking-requests/archived/', archived_requests_view, name='archived-requests'),
+    path('api/booking-requests/inbox/', BookingInboxView.as_view(), name='booking-inbox'),
+    path('api/booking-requests/counters/', booking_counters_view, name='booking-counters'),
 
     path('api/notifications/', get_user_notifications, name='user-notifications'),
     path('api/notifications/<int:notification_id>/read/', mark_notification_as_read, name='mark-notification-read'),